@@ -0,0 +1,54 @@
+from threading import Lock
+
+# UI refresh period, events are rendered at most once per frame
+FRAME_MS = 50
+
+class UIDispatcher:
+    """
+    run model event listeners on the Tk thread
+
+    listeners wrapped here may be triggered from any thread, the calls
+    are queued and run by a single after() callback once per frame,
+    repeated events of the same kind within a frame are merged so only
+    the latest data is rendered
+    """
+    def __init__(self, widget, frame_ms=FRAME_MS):
+        self.widget = widget
+        self.frame_ms = frame_ms
+        self.lock = Lock()
+        self.pending = {}
+        self.after_id = None
+
+    def wrap(self, fn, merge=True, key=None):
+        """
+        listener that posts fn(data) to the Tk thread
+        merge: keep only the latest data per frame, events with
+               different key(data) are kept apart
+        """
+        if not merge:
+            return lambda data: self.post(object(), fn, data)
+        if key is None:
+            return lambda data: self.post(fn, fn, data)
+        return lambda data: self.post((fn, key(data)), fn, data)
+
+    def post(self, key, fn, data):
+        with self.lock:
+            self.pending[key] = (fn, data)
+
+    def start(self):
+        if self.after_id is None:
+            self.after_id = self.widget.after(self.frame_ms, self.drain)
+
+    def stop(self):
+        if self.after_id is not None:
+            self.widget.after_cancel(self.after_id)
+            self.after_id = None
+
+    def drain(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        try:
+            for fn, data in pending.values():
+                fn(data)
+        finally:
+            self.after_id = self.widget.after(self.frame_ms, self.drain)
@@ -53,7 +53,7 @@ class GPSSerial:
                 if data[-1:] != expected:
                     # print('runt')
                     continue
-                model.process(ProcessID.GPS_SERIAL, data)
+                model.submit(ProcessID.GPS_SERIAL, data)
             except (SerialException, TypeError):
                 ser.close()
                 break
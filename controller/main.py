@@ -5,28 +5,43 @@ from view.main import MainView
 try:
     from udp_client import UDPClientController
     from udp_server import UDPServerController
+    from udp_server_async import AsyncUDPServerController
     from gps_serial import GPSSerial
+    from dispatch import UIDispatcher
 except ModuleNotFoundError:
     from controller.udp_client import UDPClientController
     from controller.udp_server import UDPServerController
+    from controller.udp_server_async import AsyncUDPServerController
     from controller.gps_serial import GPSSerial
+    from controller.dispatch import UIDispatcher
 
 class MainController:
     def __init__(self):
         self.win32 = model.platform == 'win32'
         self.has_gps = False
-        self.last_decode_time = None
+        # per WSJT-X instance: (pota, me, cq) call lists and last status
+        self.calls = {}
+        self.status = {}
         self.view = MainView(model.main_window_x,
                              model.main_window_y,
                              model.theme,
                              model.park,
                              model.shift,
                              self.win32)
+        # model events arrive on the worker threads, the dispatcher
+        # runs the handlers on the Tk thread once per frame
+        self.dispatch = UIDispatcher(self.view)
+        ui = self.dispatch.wrap
         model.add_event_listener(Callback.QUIT, self.do_quit)
-        model.add_event_listener(Callback.GPS_DECODE, self.gps_decode)
-        model.add_event_listener(Callback.WSJTX_STATUS, self.wsjtx_status)
-        model.add_event_listener(Callback.WSJTX_CALLS, self.wsjtx_calls)
-        model.add_event_listener(Callback.GPS_OPEN, self.gps_open)
+        model.add_event_listener(Callback.GPS_DECODE, ui(self.gps_decode))
+        model.add_event_listener(Callback.WSJTX_STATUS,
+                                 ui(self.wsjtx_status, key=lambda d: d.id_))
+        model.add_event_listener(Callback.WSJTX_CALLS,
+                                 ui(self.wsjtx_calls, key=lambda d: d[0]))
+        model.add_event_listener(Callback.WSJTX_CLOSE,
+                                 ui(self.wsjtx_close, merge=False))
+        model.add_event_listener(Callback.WSJTX_CYCLE, ui(self.wsjtx_cycle))
+        model.add_event_listener(Callback.GPS_OPEN, ui(self.gps_open))
                          
         self.view.protocol('WM_DELETE_WINDOW', model.notify_quit)
 
@@ -43,6 +58,12 @@ class MainController:
         self.view.grid_button.configure(command=self.do_grid)
         self.view.rx_tx_label.bind('<Double-1>', self.abort_tx)
                     
+        # a double-click acts on the row of its first click, the rows
+        # can move between the two clicks
+        self.pressed = {}
+        for e in (self.view.calls_pota, self.view.calls_me,
+                  self.view.calls_cq):
+            e.bind('<Button-1>', self.press)
         self.view.calls_pota.bind('<Double-1>', self.do_call_pota)
         self.view.calls_pota.bind('<Return>', self.do_call_pota)
 
@@ -52,33 +73,41 @@ class MainController:
         self.view.calls_cq.bind('<Double-1>', self.do_call_cq)
         self.view.calls_cq.bind('<Return>', self.do_call_cq)
 
-        self.lookup = {self.view.calls_pota: {},
-                       self.view.calls_me: {},
-                       self.view.calls_cq: {}}
-        self.call_data = {self.view.calls_pota: [],
-                          self.view.calls_me: [],
-                          self.view.calls_cq: []}
+        self.entries = (self.view.calls_pota,
+                        self.view.calls_me,
+                        self.view.calls_cq)
+        # per list: Treeview item -> Ranked row and Ranked row -> item
+        self.rows = {e: {} for e in self.entries}
+        self.items = {e: {} for e in self.entries}
+        self.multi = False
+        self.dispatch.start()
 
     def do_quit(self, _):
         self.view.quit()
 
-    def do_call(self, entry):
-        sel = entry.selection()
-        if len(sel) > 0:
-            index = self.lookup[entry].get(sel[0])
-            if index is not None:
-                msg = self.call_data[entry][index]
-                model.do_call(msg)
+    def press(self, e):
+        self.pressed[e.widget] = e.widget.identify_row(e.y)
+
+    def do_call(self, entry, e):
+        if e.num == 1:
+            k = self.pressed.get(entry)
+            if k in self.rows[entry]:
+                entry.selection_set(k)
+        else:
+            sel = entry.selection()
+            k = sel[0] if len(sel) > 0 else None
+        if (r := self.rows[entry].get(k)) is not None:
+            model.do_call(r.d)
 
 
     def do_call_pota(self, e):
-        self.do_call(self.view.calls_pota)
+        self.do_call(self.view.calls_pota, e)
 
     def do_call_me(self, e):
-        self.do_call(self.view.calls_me)
+        self.do_call(self.view.calls_me, e)
 
     def do_call_cq(self, e):
-        self.do_call(self.view.calls_cq)
+        self.do_call(self.view.calls_cq, e)
 
     def gps_open(self, open_):
         if self.view is not None:
@@ -97,7 +126,26 @@ class MainController:
 
     def wsjtx_status(self, d):
         if self.view is not None:
-            self.update_rx_tx(d.transmitting, d.tx_msg)
+            self.status[d.id_] = d
+            for i in self.status.values():
+                if i.transmitting:
+                    self.update_rx_tx(True, i.tx_msg)
+                    break
+            else:
+                self.update_rx_tx(False)
+
+    def wsjtx_close(self, id_):
+        if self.view is not None:
+            self.status.pop(id_, None)
+            if self.calls.pop(id_, None) is not None:
+                self.show_calls()
+
+    def wsjtx_cycle(self, d):
+        if self.view is not None:
+            id_, first, mid = d
+            rig = f'{id_}: ' if self.multi else ''
+            self.view.display_text.set(
+                f'{rig}first call {first:.1f}s, median {mid:.1f}s')
 
     def do_grid(self):
         if self.has_gps:
@@ -125,33 +173,68 @@ class MainController:
 
     def wsjtx_calls(self, d):
         if self.view is not None:
-            a = d[0] + d[1] + d[2]
-            if len(a) == 0:
-                return
-            if chg := (a[0].time != self.last_decode_time):
-                self.last_decode_time = a[0].time
-            for (d, e) in zip(d, (self.view.calls_pota,
-                                  self.view.calls_me,
-                                  self.view.calls_cq)):
-                if (chg):
-                    self.call_data[e] = []
-                    self.lookup[e] = {}
-                    for item in e.get_children():
-                        e.delete(item)
-                l = len(self.call_data[e])
-                self.call_data[e] += d
-                for i,j in enumerate(d):
-                    k = e.insert(parent='',
-                                 index='end',
-                                 values=(f"{j.snr:3}",
-                                         j.message,))
-                    self.lookup[e][k] = i + l
+            id_, *d = d
+            self.calls[id_] = d
+            self.show_calls()
+
+    def show_calls(self):
+        multi = len(self.calls) > 1
+        if multi != self.multi:
+            self.multi = multi
+            for e in self.entries:
+                e['displaycolumns'] = (
+                    ('Score','SNR','Message','Detail','Rig') if multi else
+                    ('Score','SNR','Message','Detail'))
+        for n, e in enumerate(self.entries):
+            # equal rows (a repeated decode) are shown once
+            d = list(dict.fromkeys(j for i in self.calls.values()
+                                   for j in i[n]))
+            if multi:
+                d.sort(key=lambda a: a.score, reverse=True)
+            self.update_entry(e, d)
+
+    def update_entry(self, e, d):
+        """
+        make the rows of e the Ranked rows d, in order, in place: rows
+        still ranked keep their item (and selection), the rest are
+        deleted, new rows are inserted at their rank
+        """
+        rows = self.rows[e]
+        items = self.items[e]
+        keep = set(d)
+        gone = [k for r, k in items.items() if r not in keep]
+        if gone:
+            e.delete(*gone)
+            for k in gone:
+                del items[rows.pop(k)]
+        order = list(e.get_children())
+        for n, j in enumerate(d):
+            k = items.get(j)
+            if k is None:
+                k = e.insert(parent='',
+                             index=n,
+                             values=(f"{j.d.snr:3}",
+                                     j.d.message,
+                                     j.d.id_,
+                                     f"{j.score:5.1f}",
+                                     # score components, 'snr12 grid10 ...'
+                                     ' '.join(f'{c}{v:g}'
+                                              for c, v in j.components
+                                              if v)))
+                items[j] = k
+                rows[k] = j
+                order.insert(n, k)
+            elif order[n] != k:
+                e.move(k, '', n)
+                order.remove(k)
+                order.insert(n, k)
 
     def update_rx_tx(self, tx, msg=''):
         if self.view is not None:
             self.view.rx_tx.set('TX: ' + msg.strip() if tx else 'RX')
                      
     def close(self):
+        self.dispatch.stop()
         model.save_main_window_position(self.view.winfo_x(),
                                         self.view.winfo_y())
         self.view.destroy()
@@ -162,8 +245,12 @@ def run():
         gps = GPSSerial()
     else:
         gps = UDPClientController()
-    wsjtx = UDPServerController()
+    if model.wsjtx_engine == 'asyncio':
+        wsjtx = AsyncUDPServerController()
+    else:
+        wsjtx = UDPServerController()
     mc = MainController()
+    model.start()
     gps.start()
     wsjtx.start()
     mc.view.mainloop()
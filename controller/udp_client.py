@@ -4,6 +4,7 @@ from threading import Thread
 
 from model.model import model
 from model.event import ProcessID, Callback
+from model.gpsd import LineReader
 
 class UDPClientController:
     def __init__(self):
@@ -44,13 +45,19 @@ class UDPClientController:
             self.thread.join()
         
     def run(self):
+        # gpsd reports are lines, a read may end in the middle of one
+        lines = LineReader()
         while model.running:
             try:
                 if self.do_close:
                     self.do_close = False
                     break
-                data = self.sock.recv(2048)
-                model.process(ProcessID.GPS, data)
+                data = self.sock.recv(4096)
+                if data == b'':
+                    # gpsd closed the connection
+                    break
+                for line in lines.feed(data):
+                    model.submit(ProcessID.GPS, line)
             except TimeoutError:
                 continue
             except OSError as e:
@@ -1,27 +1,142 @@
 import socket
+from select import select
 from struct import pack
 from threading import Thread
+from time import perf_counter
 from model.model import model
 from model.event import ProcessID, Callback
+from model.capture import Recorder
+from model.rx_msg import client_id, valid
+
+# larger than any UDP payload, a full buffer means truncation
+MAX_DATAGRAM = 65536
+WSAEMSGSIZE = 10040
+
+def wsjtx_socket():
+    """ UDP socket bound to the WSJT-X address, joined if multicast """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    host = model.wsjtx_address[0]
+    if int(host.split('.')[0]) in range(224,240):
+        mreq = pack("4sii",
+                   socket.inet_aton(host),
+                   socket.INADDR_ANY, 0)
+        sock.setsockopt(socket.IPPROTO_IP,
+                        socket.IP_ADD_MEMBERSHIP,
+                        mreq)
+        host = ''
+    if (rcvbuf := model.wsjtx_rcvbuf) > 0:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    sock.bind(model.wsjtx_address)
+    return sock
+
+def resolve(destinations):
+    """
+    (address, port) of each (host, port) as recvfrom reports it, so
+    replies from a consumer match, hosts that do not resolve are skipped
+    """
+    r = []
+    for host, port in destinations:
+        try:
+            a = socket.getaddrinfo(host, port, socket.AF_INET,
+                                   socket.SOCK_DGRAM)
+        except (socket.gaierror, UnicodeError):
+            continue
+        if (addr := a[0][4]) not in r:
+            r.append(addr)
+    return r
+
+class Clients:
+    """ sender address of every WSJT-X instance, keyed by client id """
+    def __init__(self):
+        self.addrs = {}
+        self.ids = {}
+
+    def seen(self, data, addr):
+        """ False if data is not a WSJT-X datagram """
+        if not valid(data):
+            return False
+        # the client id is only read for a new sender address
+        if addr not in self.ids:
+            if (id_ := client_id(data)) is None:
+                return False
+            self.ids[addr] = id_
+            self.addrs[id_] = addr
+        return True
+
+    def route(self, id_):
+        """ address of instance id_, None if it was never heard """
+        return self.addrs.get(id_)
+
+class RelayStats:
+    __slots__ = ('sent', 'dropped', 'latency', 'max_latency')
+
+    def __init__(self):
+        self.sent = 0
+        self.dropped = 0
+        self.latency = 0.0
+        self.max_latency = 0.0
+
+    @property
+    def mean_latency(self):
+        return self.latency / self.sent if self.sent else 0.0
+
+class Relay:
+    """
+    forward every WSJT-X datagram unchanged to downstream consumers
+    (GridTracker, JTAlert, ...) and send their replies back to the
+    WSJT-X instance named in the reply header
+    """
+    def __init__(self, destinations, sendto, clients):
+        self.destinations = tuple(resolve(destinations))
+        self.downstream = frozenset(self.destinations)
+        self.stats = {i: RelayStats() for i in self.destinations}
+        self.sendto = sendto
+        self.clients = clients
+
+    def forward(self, data, received):
+        """ received: perf_counter() when data arrived """
+        for addr in self.destinations:
+            s = self.stats[addr]
+            try:
+                self.sendto(data, addr)
+            except OSError:
+                # consumer not running or socket buffer full
+                s.dropped += 1
+                continue
+            s.sent += 1
+            latency = perf_counter() - received
+            s.latency += latency
+            if latency > s.max_latency:
+                s.max_latency = latency
+
+    def reply(self, data):
+        if not valid(data):
+            return
+        if (addr := self.clients.route(client_id(data))) is not None:
+            try:
+                self.sendto(data, addr)
+            except OSError:
+                pass
 
 class UDPServerController:
     def __init__(self):
         model.add_event_listener(Callback.WSJTX_SEND, self.send)
-        self.addr = None
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.sock.settimeout(1.0)
+        self.clients = Clients()
+        c = model.capture_file
+        self.recorder = None if c == '' else Recorder(c)
+        self.sock = wsjtx_socket()
+        self.sock.setblocking(False)
+        self.buf = bytearray(MAX_DATAGRAM)
+        self.view = memoryview(self.buf)
+        self.datagrams = 0
+        self.bytes = 0
+        self.truncated = 0
+        self.invalid = 0
+        d = model.relay_destinations
+        self.relay = (None if len(d) == 0 else
+                      Relay(d, self.sock.sendto, self.clients))
         self.thread = Thread(target=self.run)
-        host = model.wsjtx_address[0]
-        if int(host.split('.')[0]) in range(224,240):
-            mreq = pack("4sii",
-                       socket.inet_aton(host),
-                       socket.INADDR_ANY, 0)
-            self.sock.setsockopt(socket.IPPROTO_IP,
-                                 socket.IP_ADD_MEMBERSHIP,
-                                 mreq)
-            host = ''
-        self.sock.bind(model.wsjtx_address)
 
     def report(self, open_):
         model.notify_state(ProcessID.WSJTX, open_)
@@ -30,21 +145,56 @@ class UDPServerController:
         self.thread.start()
 
     def send(self, data):
-        if self.addr is not None:
-            self.sock.sendto(data, self.addr)
+        id_, data = data
+        if (addr := self.clients.route(id_)) is not None:
+            self.sock.sendto(data, addr)
 
     def stop(self):
         self.thread.join()
+        if self.recorder is not None:
+            self.recorder.close()
         
+    def drain(self):
+        """ receive every queued datagram into the buffer """
+        while True:
+            try:
+                n, addr = self.sock.recvfrom_into(self.buf)
+            except BlockingIOError:
+                return
+            except ConnectionResetError:
+                # windows: ICMP port unreachable for an earlier sendto,
+                # e.g. a relay destination that is not running
+                continue
+            except OSError as e:
+                # windows reports an oversized datagram as an error
+                if getattr(e, 'winerror', None) == WSAEMSGSIZE:
+                    self.truncated += 1
+                    continue
+                raise
+            self.datagrams += 1
+            self.bytes += n
+            if n == MAX_DATAGRAM:
+                self.truncated += 1
+            data = self.view[:n]
+            if self.relay is not None:
+                if addr in self.relay.downstream:
+                    self.relay.reply(data)
+                    continue
+                self.relay.forward(data, perf_counter())
+            if not self.clients.seen(data, addr):
+                # not WSJT-X, never reaches the model
+                self.invalid += 1
+                continue
+            if self.recorder is not None:
+                self.recorder.write(data)
+            model.submit(ProcessID.WSJTX, data)
+
     def run(self):
         self.report(True)
         while model.running:
-            try:
-                data, self.addr = self.sock.recvfrom(1024)
-                model.process(ProcessID.WSJTX, data)
-            except TimeoutError:
-                # print('timeout')
-                continue
+            r, _, _ = select((self.sock,), (), (), 1.0)
+            if r:
+                self.drain()
         self.report(False)
 
 if __name__ == '__main__':
@@ -0,0 +1,103 @@
+import asyncio
+from threading import Thread, current_thread
+from time import perf_counter
+from model.model import model
+from model.event import ProcessID, Callback
+from model.capture import Recorder
+
+try:
+    from udp_server import wsjtx_socket, Clients, Relay
+except ModuleNotFoundError:
+    from controller.udp_server import wsjtx_socket, Clients, Relay
+
+class WsjtxProtocol(asyncio.DatagramProtocol):
+    def __init__(self, controller):
+        self.controller = controller
+
+    def connection_made(self, transport):
+        self.controller.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.controller.received(data, addr)
+
+class AsyncUDPServerController:
+    """
+    same contract as UDPServerController, but datagrams are received
+    and replies sent by an asyncio event loop running in its own thread
+    """
+    def __init__(self):
+        model.add_event_listener(Callback.WSJTX_SEND, self.send)
+        self.clients = Clients()
+        c = model.capture_file
+        self.recorder = None if c == '' else Recorder(c)
+        self.sock = wsjtx_socket()
+        self.loop = asyncio.new_event_loop()
+        self.transport = None
+        self.datagrams = 0
+        self.bytes = 0
+        self.truncated = 0
+        self.invalid = 0
+        d = model.relay_destinations
+        self.relay = (None if len(d) == 0 else
+                      Relay(d, self.relay_to, self.clients))
+        self.thread = Thread(target=self.run)
+
+    def report(self, open_):
+        model.notify_state(ProcessID.WSJTX, open_)
+
+    def start(self):
+        self.thread.start()
+
+    def relay_to(self, data, addr):
+        if self.transport is not None:
+            self.transport.sendto(data, addr)
+
+    def received(self, data, addr):
+        if self.relay is not None:
+            if addr in self.relay.downstream:
+                self.relay.reply(data)
+                return
+            self.relay.forward(data, perf_counter())
+        self.datagrams += 1
+        self.bytes += len(data)
+        if not self.clients.seen(data, addr):
+            self.invalid += 1
+            return
+        if self.recorder is not None:
+            self.recorder.write(data)
+        model.submit(ProcessID.WSJTX, data)
+
+    def sendto(self, data):
+        id_, data = data
+        addr = self.clients.route(id_)
+        if addr is not None and self.transport is not None:
+            self.transport.sendto(data, addr)
+
+    def send(self, data):
+        if current_thread() is self.thread:
+            self.sendto(data)
+        elif self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.sendto, data)
+
+    def stop(self):
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.thread.is_alive():
+            self.thread.join()
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(
+            self.loop.create_datagram_endpoint(
+                lambda: WsjtxProtocol(self), sock=self.sock))
+        self.report(True)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.transport.close()
+            self.transport = None
+            self.loop.run_until_complete(asyncio.sleep(0))
+            self.loop.close()
+            self.report(False)
@@ -0,0 +1,413 @@
+"""streaming ADIF reader and writer"""
+import os
+import re
+from io import StringIO
+from time import gmtime, strftime
+from datetime import date, datetime, timezone
+
+# <name:length[:type]> or <eoh> / <eor>
+TAG = re.compile(r'<([A-Za-z0-9_]+)(?::(\d+)(?::[A-Za-z])?)?>')
+EOH = re.compile(r'<eoh>', re.I)
+EOR = re.compile(r'<eor>', re.I)
+CHUNK = 1 << 16
+
+# ADIF band -> MHz as WsjtxInstance.band (dial_freq // 1_000_000)
+BANDS = {'160m': 1, '80m': 3, '60m': 5, '40m': 7, '30m': 10, '20m': 14,
+         '17m': 18, '15m': 21, '12m': 24, '10m': 28, '6m': 50, '4m': 70,
+         '2m': 144, '1.25m': 222, '70cm': 432}
+
+# ADIF band: lower and upper edge, MHz
+BAND_EDGES = (('2190m', 0.1357, 0.1378), ('630m', 0.472, 0.479),
+              ('160m', 1.8, 2.0), ('80m', 3.5, 4.0), ('60m', 5.06, 5.45),
+              ('40m', 7.0, 7.3), ('30m', 10.1, 10.15), ('20m', 14.0, 14.35),
+              ('17m', 18.068, 18.168), ('15m', 21.0, 21.45),
+              ('12m', 24.89, 24.99), ('10m', 28.0, 29.7), ('6m', 50.0, 54.0),
+              ('4m', 70.0, 71.0), ('2m', 144.0, 148.0),
+              ('1.25m', 222.0, 225.0), ('70cm', 420.0, 450.0),
+              ('33cm', 902.0, 928.0), ('23cm', 1240.0, 1300.0))
+# whole MHz (the qsos band column) -> ADIF band
+BAND_NAMES = {m: name for name, lower, upper in BAND_EDGES if lower >= 1
+              for m in range(int(lower), int(upper) + 1)}
+
+def band_name(hz, mhz):
+    """ ADIF band of frequency hz, else of band column mhz, '' if none """
+    if hz:
+        f = hz / 1_000_000
+        for name, lower, upper in BAND_EDGES:
+            if lower <= f <= upper:
+                return name
+    return BAND_NAMES.get(mhz, '')
+
+HEADER = ('ADIF Export\n'
+          '<adif_ver:5>3.1.4\n'
+          '<programid:9>wsjtx-udp\n'
+          '<EOH>\n')
+
+# modes that ADIF writes as MFSK with a submode
+SUBMODES = frozenset(('FT4', 'FST4', 'Q65', 'JS8'))
+
+def records(f, chunk=CHUNK):
+    """
+    dict of the fields of each record read from text file f, names lower
+    case, the header is skipped, only about chunk characters (and the
+    longest value) are held in memory
+    """
+    search = TAG.search
+    r = {}
+    buf = ''
+    pos = 0
+    eof = False
+    while True:
+        m = search(buf, pos)
+        if m is not None:
+            name, n = m.group(1, 2)
+            start = m.end()
+            end = start + int(n) if n else start
+            if end <= len(buf) or eof:
+                pos = end
+                name = name.lower()
+                if name == 'eor':
+                    yield r
+                    r = {}
+                elif name == 'eoh':
+                    r = {}
+                else:
+                    r[name] = buf[start:end]
+                continue
+        if eof:
+            return
+        # keep the unfinished tag or value, read more
+        keep = m.start() if m is not None else buf.rfind('<', pos)
+        buf = (buf[keep:] if keep >= 0 else '') + (s := f.read(chunk))
+        pos = 0
+        eof = s == ''
+
+def timestamp(day, time):
+    """ ADIF date YYYYMMDD and time HHMM[SS] as a UTC timestamp """
+    return datetime(int(day[:4]), int(day[4:6]), int(day[6:8]),
+                    int(time[:2]), int(time[2:4]), int(time[4:6] or 0),
+                    tzinfo=timezone.utc).timestamp()
+
+def field(name, value):
+    """ <name:length>value, '' for an empty value """
+    value = str(value)
+    return f'<{name}:{len(value)}>{value} ' if value > '' else ''
+
+def date_time(t):
+    """ timestamp as ADIF (YYYYMMDD, HHMMSS) UTC """
+    t = gmtime(t)
+    return strftime('%Y%m%d', t), strftime('%H%M%S', t)
+
+def qso_record(row):
+    """ ADIF record for a qsos row (EXPORT_COLUMNS order) """
+    (time_off, dx_call, dx_grid, tx_freq, mode, rst_sent, rst_recv,
+     tx_power, comments, name, time_on, op_call, my_call, my_grid,
+     ex_sent, ex_recv, adif_md, band, park) = row
+    day_on, t_on = date_time(time_on)
+    day_off, t_off = date_time(time_off or time_on)
+    if mode in SUBMODES:
+        mode = f'{field("mode", "MFSK")}{field("submode", mode)}'
+    else:
+        mode = field('mode', mode)
+    return ''.join((
+        field('call', dx_call),
+        field('gridsquare', dx_grid),
+        mode,
+        field('rst_sent', rst_sent),
+        field('rst_rcvd', rst_recv),
+        field('qso_date', day_on),
+        field('time_on', t_on),
+        field('qso_date_off', day_off),
+        field('time_off', t_off),
+        field('band', band_name(tx_freq, band)),
+        field('freq', f'{tx_freq / 1_000_000:.6f}' if tx_freq else ''),
+        field('station_callsign', my_call),
+        field('my_gridsquare', my_grid),
+        field('tx_pwr', tx_power),
+        field('comment', comments),
+        field('name', name),
+        field('operator', op_call),
+        field('stx_string', ex_sent),
+        field('srx_string', ex_recv),
+        field('prop_mode', adif_md),
+        field('my_sig', 'POTA' if park else ''),
+        field('my_sig_info', park),
+        '<EOR>\n'))
+
+def write(f, rows):
+    """ write the header and a record per row, returns the count """
+    f.write(HEADER)
+    n = 0
+    for n, row in enumerate(rows, 1):
+        f.write(qso_record(row))
+    return n
+
+def file_header(header):
+    """
+    header of an ADIF text as the start of a file, HEADER if none, a file
+    starting with '<' has no header so a text line is put first
+    """
+    if header == '':
+        return HEADER
+    if header[0] == '<':
+        header = 'ADIF Export\n' + header
+    return header + '\n'
+
+def record_key(r):
+    """ (call, date time_on, band, mode) identifying a QSO record """
+    mode = r.get('mode', '').upper()
+    if mode == 'MFSK' and 'submode' in r:
+        mode = r['submode'].upper()
+    return (r.get('call', '').upper(),
+            r.get('qso_date', '') + r.get('time_on', '').ljust(6, '0'),
+            r.get('band', '').lower(),
+            mode)
+
+class AdifLog:
+    """
+    append-only .adi file kept open, a record whose record_key is already
+    in the file is skipped (WSJT-X re-sending a QSO, a restart), the keys
+    are read by streaming the file on the first load() or append(), on
+    the thread that writes, not when it is opened
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.keys = None
+        self.f = open(filename, 'a', encoding='utf-8')
+        self.header = self.f.tell() > 0
+        self.written = 0
+        self.duplicates = 0
+
+    def load(self):
+        """ read the keys of the records in the file, once """
+        if self.keys is None:
+            keys = set()
+            self.f.flush()
+            with open(self.filename, encoding='utf-8',
+                      errors='replace') as f:
+                for r in records(f):
+                    keys.add(record_key(r))
+            self.keys = keys
+
+    def append(self, text):
+        """ the new records of an ADIF text, returns how many """
+        self.load()
+        m = EOH.search(text)
+        header, body = (text[:m.end()], text[m.end():]) if m else ('', text)
+        n = 0
+        start = 0
+        for m in EOR.finditer(body):
+            record = body[start:m.end()]
+            start = m.end()
+            r = next(records(StringIO(record)), None)
+            if r is None:
+                continue
+            key = record_key(r)
+            if key in self.keys:
+                self.duplicates += 1
+                continue
+            if not self.header:
+                self.f.write(file_header(header))
+                self.header = True
+            self.keys.add(key)
+            self.f.write(record.strip() + '\n')
+            n += 1
+        self.written += n
+        return n
+
+    def flush(self):
+        """ on disk when this returns """
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def close(self):
+        self.flush()
+        self.f.close()
+
+def qso_row(r, park='', shift=''):
+    """
+    qsos row (WsjtxDb.INSERT_QSO order) for record r, None without call,
+    date or time, the park is MY_SIG_INFO of a POTA activation if any
+    """
+    call = r.get('call', '').upper()
+    day = r.get('qso_date', '')
+    time_on = r.get('time_on', '')
+    if call == '' or len(day) < 8 or len(time_on) < 4:
+        return None
+    mode = r.get('mode', '').upper()
+    if mode == 'MFSK' and 'submode' in r:
+        mode = r['submode'].upper()
+    try:
+        mhz = float(r['freq'])
+    except (KeyError, ValueError):
+        mhz = None
+    band = int(mhz) if mhz is not None else BANDS.get(
+        r.get('band', '').lower(), 0)
+    if r.get('my_sig', '').upper() == 'POTA':
+        park = r.get('my_sig_info', park)
+    else:
+        park = r.get('my_pota_ref', park)
+    on = timestamp(day, time_on)
+    try:
+        off = timestamp(r.get('qso_date_off', day), r['time_off'])
+    except (KeyError, ValueError):
+        off = on
+    return (off,
+            call,
+            r.get('gridsquare', ''),
+            0 if mhz is None else round(mhz * 1_000_000),
+            mode,
+            r.get('rst_sent', ''),
+            r.get('rst_rcvd', ''),
+            r.get('tx_pwr', ''),
+            r.get('comment', ''),
+            r.get('name', ''),
+            on,
+            r.get('operator', ''),
+            r.get('station_callsign', ''),
+            r.get('my_gridsquare', ''),
+            r.get('stx_string', ''),
+            r.get('srx_string', ''),
+            r.get('prop_mode', ''),
+            date(int(day[:4]), int(day[4:6]), int(day[6:8])).toordinal(),
+            band,
+            park,
+            shift)
+
+
+if __name__ == '__main__':
+    # without arguments: benchmark on a synthetic 100k record export
+    import os
+    import sys
+    import tracemalloc
+    from argparse import ArgumentParser
+    from random import Random
+    from tempfile import TemporaryDirectory
+    from time import perf_counter
+    from types import SimpleNamespace
+
+    p = ArgumentParser(description='import/export the worked-before log')
+    sub = p.add_subparsers(dest='command')
+    i = sub.add_parser('import', help='add the QSOs of an ADIF file')
+    i.add_argument('filename')
+    i.add_argument('--park', default='')
+    i.add_argument('--shift', default='')
+    e = sub.add_parser('export', help='write the matching QSOs as ADIF')
+    e.add_argument('filename')
+    e.add_argument('--park')
+    e.add_argument('--shift')
+    e.add_argument('--date', type=date.fromisoformat,
+                   help='UTC date logged, YYYY-MM-DD')
+    e.add_argument('--band', type=int, help='MHz, e.g. 14')
+    e.add_argument('--mode')
+    args = p.parse_args()
+
+    if args.command is not None:
+        try:
+            from model.model import model
+        except ModuleNotFoundError:
+            from model import model
+        t = perf_counter()
+        if args.command == 'import':
+            n, skipped = model.wsjtx_db.import_adif(args.filename,
+                                                    args.park, args.shift)
+            print(f'{n:,} records imported, {skipped:,} skipped', end='')
+        else:
+            n = model.wsjtx_db.export_adif(args.filename, park=args.park,
+                                           shift=args.shift, day=args.date,
+                                           band=args.band, mode=args.mode)
+            print(f'{n:,} records exported', end='')
+        s = perf_counter() - t
+        model.close()
+        print(f', {n / s:,.0f} records/sec')
+        sys.exit()
+
+    try:
+        from wsjtx_db import WsjtxDb
+    except ModuleNotFoundError:
+        from model.wsjtx_db import WsjtxDb
+
+    N = 100_000
+    rnd = Random(1)
+    parks = [f'K-{i:04d}' for i in range(100)]
+
+    with TemporaryDirectory() as td:
+        fn = os.path.join(td, 'export.adi')
+        with open(fn, 'w') as f:
+            f.write('POTA export\n<adif_ver:5>3.1.4 <eoh>\n')
+            for i in range(N):
+                f.write(field('call', f'K{i}XYZ')
+                        + field('qso_date', f'2024{rnd.randrange(1, 13):02d}'
+                                f'{rnd.randrange(1, 29):02d}')
+                        + field('time_on', f'{rnd.randrange(24):02d}'
+                                f'{rnd.randrange(60):02d}00')
+                        + ''.join(rnd.choice((
+                            (field('band', '20m'), field('freq', '14.075')),
+                            (field('band', '40m'), field('freq', '7.076')))))
+                        + field('mode', 'FT8')
+                        + field('gridsquare', 'FN42')
+                        + field('rst_sent', '-10')
+                        + field('rst_rcvd', '-12')
+                        + field('comment', 'a <tag> in a comment')
+                        + field('my_sig', 'POTA')
+                        + field('my_sig_info', rnd.choice(parks))
+                        + '<eor>\n')
+        size = os.path.getsize(fn)
+
+        with open(fn) as f:
+            t = perf_counter()
+            n = sum(1 for _ in records(f))
+            s = perf_counter() - t
+        print(f'parse  {n:,} records, {size / 1e6:.1f} MB,'
+              f' {n / s:12,.0f} records/sec')
+
+        settings = SimpleNamespace(park='', shift='',
+                                   sync_records=8, sync_ms=2000)
+        model = SimpleNamespace(dbn=os.path.join(td, 'bench.sqlite'),
+                                adifn=os.path.join(td, 'bench.adi'),
+                                settings=settings)
+        db = WsjtxDb(model)
+        t = perf_counter()
+        n, skipped = db.import_adif(fn)
+        s = perf_counter() - t
+        print(f'import {n:,} records, {skipped} skipped,'
+              f' {n / s:12,.0f} records/sec, {len(db.worked):,} worked')
+
+        sql, params = db.export_query(park='K-0042', shift='')
+        print(db.con.execute('explain query plan ' + sql,
+                             params).fetchall()[0][-1])
+        out = os.path.join(td, 'park.adi')
+        for name, filters in (('park', {'park': 'K-0042', 'shift': ''}),
+                              ('all', {})):
+            t = perf_counter()
+            n = db.export_adif(out, **filters)
+            s = perf_counter() - t
+            tracemalloc.start()
+            db.export_adif(out, **filters)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f'export {name:4} {n:7,} records in {s * 1000:6.0f} ms,'
+                  f' {n / s:10,.0f} records/sec, peak {peak:,} bytes')
+        with open(out, encoding='utf-8') as f:
+            assert sum(1 for _ in records(f)) == n
+        db.close()
+
+        # the dedup index of a 100k record log, then re-sent records
+        # opened at startup, keys read later on the writer thread
+        t = perf_counter()
+        log = AdifLog(out)
+        s = perf_counter() - t
+        t = perf_counter()
+        log.load()
+        s2 = perf_counter() - t
+        print(f'log    opened in {s * 1000:.1f} ms,'
+              f' {len(log.keys):,} keys read in {s2 * 1000:.0f} ms')
+        with open(fn) as f:
+            text = f.read().split('<eoh>\n', 1)[1].splitlines()
+        t = perf_counter()
+        for i in text[:20_000]:
+            log.append('WSJT-X ADIF Export<EOH>\n' + i)
+        s = perf_counter() - t
+        log.close()
+        print(f'append {20_000 / s:12,.0f} records/sec,'
+              f' {log.written} written, {log.duplicates} duplicates')
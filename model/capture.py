@@ -0,0 +1,119 @@
+"""record/replay raw WSJT-X datagrams"""
+import mmap
+from os import path
+from struct import Struct
+from time import time, sleep
+
+# file: MAGIC, then one RECORD (timestamp, length) + datagram per packet
+MAGIC = b'WSJXCAP\x01'
+RECORD = Struct('>dI')
+
+class Recorder:
+    def __init__(self, filename):
+        new = not path.isfile(filename) or path.getsize(filename) == 0
+        self.f = open(filename, 'ab')
+        if new:
+            self.f.write(MAGIC)
+
+    def write(self, data, t=None):
+        self.f.write(RECORD.pack(time() if t is None else t, len(data)))
+        self.f.write(data)
+
+    def close(self):
+        self.f.close()
+
+def read(filename):
+    """ yield (timestamp, datagram) from a capture file """
+    with open(filename, 'rb') as f:
+        if path.getsize(filename) <= len(MAGIC):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:len(MAGIC)] != MAGIC:
+                raise ValueError(f'{filename} is not a capture file')
+            o = len(MAGIC)
+            end = len(mm)
+            while o + RECORD.size <= end:
+                t, n = RECORD.unpack_from(mm, o)
+                o += RECORD.size
+                if o + n > end:
+                    # truncated by a crash while recording
+                    break
+                yield t, mm[o:o + n]
+                o += n
+
+def replay(filename, process, realtime=False):
+    """
+    call process(datagram) for every datagram in the capture,
+    as fast as possible or with the recorded timing
+    returns the number of datagrams
+    """
+    count = 0
+    start = None
+    for t, data in read(filename):
+        if realtime:
+            if start is None:
+                start = time() - t
+            elif (wait := t + start - time()) > 0:
+                sleep(wait)
+        process(data)
+        count += 1
+    return count
+
+
+if __name__ == '__main__':
+    import sys
+    from argparse import ArgumentParser
+    try:
+        from model.model import model
+        from model.event import ProcessID, Callback
+        from model.rx_msg import peek, parse_many
+    except ModuleNotFoundError:
+        from model import model
+        from event import ProcessID, Callback
+        from rx_msg import peek, parse_many
+
+    p = ArgumentParser(description='replay a WSJT-X capture through the model')
+    p.add_argument('filename')
+    p.add_argument('--realtime', action='store_true',
+                   help='keep the recorded timing')
+    p.add_argument('--log', action='store_true',
+                   help='also replay LOG and ADIF (writes the qso database)')
+    p.add_argument('--quiet', action='store_true',
+                   help='do not print the call lists')
+    args = p.parse_args()
+
+    def show(d):
+        id_, *lists = d
+        print(id_, ' | '.join(','.join(f'{j.d.snr}:{j.d.message}'
+                                       for j in calls)
+                              for calls in lists))
+
+    if not args.quiet:
+        model.add_event_listener(Callback.WSJTX_CALLS, show)
+
+    # as fast as possible, a run of DECODEs (a cycle, a WSJT-X Replay)
+    # is decoded in one parse_many() batch
+    burst = []
+
+    def flush():
+        if burst:
+            model.process_decodes(parse_many(burst))
+            burst.clear()
+
+    def process(data):
+        msg_id = peek(data).msg_id
+        if msg_id == 2 and not args.realtime:
+            burst.append(data)
+            return
+        flush()
+        if args.log or msg_id not in (5, 12):
+            model.process(ProcessID.WSJTX, data)
+
+    s = time()
+    n = replay(args.filename, process, args.realtime)
+    flush()
+    s = time() - s
+    # the database writer thread commits what was queued
+    model.close()
+    print(f'{n} datagrams in {s:.3f}s, {n / s if s else 0:,.0f} datagrams/sec',
+          file=sys.stderr)
@@ -18,4 +18,6 @@ class Callback(Enum):
     WSJTX_OPEN = auto()
     WSJTX_STATUS = auto()
     WSJTX_CALLS = auto()
+    WSJTX_CLOSE = auto()
+    WSJTX_CYCLE = auto()
 
@@ -0,0 +1,151 @@
+"""classify FT8/FT4 decoded message text"""
+import re
+from enum import Enum, auto
+from collections import namedtuple
+
+class Kind(Enum):
+    CQ = auto()         # CQ [target] CALL [GRID], also QRZ
+    TO_ME = auto()      # de_call CALL ..., dx_call is the sender
+    QSO = auto()        # CALL1 CALL2 ... between other stations
+    FREE_TEXT = auto()
+
+Parsed = namedtuple('Parsed', ('kind', 'dx_call', 'to', 'target',
+                               'grid', 'report'))
+
+# <...> is a hashed call, <...> alone a hash WSJT-X could not resolve
+CALL = re.compile(r'<?(?:[A-Z0-9]{1,4}/)?[A-Z0-9]{0,3}[0-9][A-Z0-9]{0,3}'
+                  r'[A-Z](?:/[A-Z0-9]{1,4})?>?|<\.\.\.>')
+GRID = re.compile(r'R?[A-R]{2}[0-9]{2}')
+REPORT = re.compile(r'R?[+-][0-9]{2}')
+# directed CQ: CQ DX, CQ NA, CQ POTA, CQ TEST, CQ 290 ...
+TARGET = re.compile(r'[A-Z]{1,4}|[0-9]{3}')
+
+ACKS = frozenset(('RRR', 'RR73', '73'))
+CQS = frozenset(('CQ', 'QRZ'))
+
+FREE = Parsed(Kind.FREE_TEXT, '', '', '', '', '')
+
+def strip(call):
+    return call[1:-1] if call[:1] == '<' else call
+
+def parse_tail(tokens):
+    """ grid or report/ack after the calls """
+    grid = report = ''
+    for t in tokens:
+        if t in ACKS:
+            report = t
+        elif GRID.fullmatch(t):
+            grid = t
+        elif REPORT.fullmatch(t) or t == 'R':
+            report = t if report == '' else report + ' ' + t
+    return grid, report
+
+def parse(message):
+    """ classify one message, without regard to de_call """
+    # DXpedition mode: 'K1ABC RR73; W9XYZ <KH1/KH7Z> -12'
+    if ';' in message:
+        first, _, second = message.partition(';')
+        second = parse(second)
+        t = first.split()
+        if second.kind is not Kind.QSO or len(t) != 2:
+            return FREE
+        return (Parsed(Kind.QSO, second.dx_call, strip(t[0]), '', '', t[1]),
+                second)
+    t = message.split()
+    if len(t) < 2:
+        return FREE
+    if t[0] in CQS:
+        target = ''
+        n = 1
+        if (len(t) > 2 and TARGET.fullmatch(t[1])
+            and CALL.fullmatch(t[2])):
+            target = t[1]
+            n = 2
+        if not CALL.fullmatch(t[n]):
+            return FREE
+        grid, report = parse_tail(t[n + 1:])
+        return Parsed(Kind.CQ, strip(t[n]), '', target, grid, report)
+    if CALL.fullmatch(t[0]) and CALL.fullmatch(t[1]):
+        grid, report = parse_tail(t[2:])
+        return Parsed(Kind.QSO, strip(t[1]), strip(t[0]), '', grid, report)
+    return FREE
+
+_cache = {}
+CACHE_SIZE = 8192
+
+def classify(message, de_call=''):
+    """
+    Parsed for a decoded message, kind TO_ME if it is sent to de_call,
+    the same text is parsed only once (bounded cache)
+    """
+    try:
+        p = _cache[message]
+    except KeyError:
+        if len(_cache) >= CACHE_SIZE:
+            _cache.clear()
+        p = _cache[message] = parse(message)
+    if type(p) is tuple:
+        # DXpedition: the part sent to de_call, else the first one
+        for i in p:
+            if i.to == de_call and de_call > '':
+                return i._replace(kind=Kind.TO_ME)
+        return p[0]
+    if p.kind is Kind.QSO and p.to == de_call and de_call > '':
+        return p._replace(kind=Kind.TO_ME)
+    return p
+
+
+if __name__ == '__main__':
+    # throughput on a synthetic mix of typical decode text
+    from random import Random
+    from timeit import timeit
+
+    rnd = Random(1)
+    calls = ([f'K{i}ABC' for i in range(400)]
+             + [f'VE{i}XYZ' for i in range(100)]
+             + [f'W{i}AB/P' for i in range(50)]
+             + [f'EA8/DL{i}ZZ' for i in range(50)])
+    grids = [f'{a}{b}{c}{d}' for a in 'DEFC' for b in 'LMN'
+             for c in '0123456789' for d in '0123456789']
+    reports = [f'{s}{n:02d}' for s in '+-' for n in range(25)]
+
+    def message():
+        c1, c2 = rnd.sample(calls, 2)
+        match rnd.randrange(12):
+            case 0 | 1 | 2:
+                return f'CQ {c1} {rnd.choice(grids)}'
+            case 3:
+                return f'CQ POTA {c1} {rnd.choice(grids)}'
+            case 4:
+                return f'CQ {rnd.choice(("DX", "NA", "EU", "290"))} {c1} {rnd.choice(grids)}'
+            case 5:
+                return f'{c1} {c2} {rnd.choice(grids)}'
+            case 6:
+                return f'{c1} {c2} {rnd.choice(reports)}'
+            case 7:
+                return f'{c1} {c2} R{rnd.choice(reports)}'
+            case 8:
+                return f'{c1} {c2} {rnd.choice(("RRR", "RR73", "73"))}'
+            case 9:
+                return f'<{c1}> {c2} {rnd.choice(reports)}'
+            case 10:
+                return f'{c1} RR73; {c2} <KH1/KH7Z> {rnd.choice(reports)}'
+            case _:
+                return 'TNX 73 GL'
+
+    messages = [message() for _ in range(5000)]
+    for m in messages[:12]:
+        print(f'{m:40} {classify(m, "K1ABC")}')
+
+    def uncached():
+        for m in messages:
+            parse(m)
+
+    def cached():
+        for m in messages:
+            classify(m, 'K1ABC')
+
+    N = 20
+    for name, fn in (('parse', uncached), ('classify', cached)):
+        s = timeit(fn, number=N)
+        print(f'{name:9} {N * len(messages) / s:12,.0f} messages/sec')
@@ -0,0 +1,118 @@
+"""gpsd JSON stream: line framing and report decoding"""
+import re
+from json import loads, JSONDecodeError
+
+# longest report kept, SKY with many satellites is a few KB
+MAX_LINE = 1 << 16
+
+CLASS = re.compile(rb'"class":"(\w+)"')
+LAT = re.compile(rb'"lat":(-?[0-9.]+(?:[eE][-+]?[0-9]+)?)')
+LON = re.compile(rb'"lon":(-?[0-9.]+(?:[eE][-+]?[0-9]+)?)')
+TIME = re.compile(rb'"time":"([^"]*)"')
+
+# reports the model has no use for, never parsed
+SKIP = frozenset((b'SKY', b'ATT', b'GST', b'PPS', b'TOFF', b'IMU',
+                  b'RAW', b'SUBFRAME', b'AIS', b'RTCM2', b'RTCM3'))
+
+class LineReader:
+    """ complete lines of a byte stream, a partial line waits for the rest """
+    __slots__ = ('partial', 'maxlen', 'dropped')
+
+    def __init__(self, maxlen=MAX_LINE):
+        self.partial = b''
+        self.maxlen = maxlen
+        self.dropped = 0
+
+    def feed(self, data):
+        lines = (self.partial + data).split(b'\n')
+        self.partial = lines.pop()
+        if len(self.partial) > self.maxlen:
+            # no newline coming, not gpsd
+            self.partial = b''
+            self.dropped += 1
+        return [i for i in (j.strip() for j in lines) if i]
+
+def report(line):
+    """
+    dict of one gpsd report line, None for SKIP classes and bad lines,
+    TPV only has class, lat, lon and time (those present)
+    """
+    m = CLASS.search(line, 0, 32)
+    if m is None:
+        return None
+    c = m[1]
+    if c in SKIP:
+        return None
+    if c == b'TPV':
+        r = {'class': 'TPV'}
+        if (m := LAT.search(line)) is not None:
+            r['lat'] = float(m[1])
+        if (m := LON.search(line)) is not None:
+            r['lon'] = float(m[1])
+        if (m := TIME.search(line)) is not None:
+            r['time'] = m[1].decode()
+        return r
+    try:
+        return loads(line)
+    except JSONDecodeError:
+        return None
+
+
+if __name__ == '__main__':
+    # a gpsd stream (TPV and SKY once a second) split at random points
+    from random import Random
+    from timeit import timeit
+    from json import dumps
+
+    rnd = Random(1)
+    stream = []
+    for i in range(1000):
+        stream.append(dumps({
+            'class': 'TPV', 'device': '/dev/ttyACM0', 'mode': 3,
+            'time': f'2024-03-22T12:{i // 60 % 60:02d}:{i % 60:02d}.000Z',
+            'ept': 0.005, 'lat': 40.0 + i / 1e4, 'lon': -83.0 - i / 1e4,
+            'altHAE': 250.1, 'epx': 3.1, 'epy': 4.2, 'track': 0.0,
+            'speed': 0.02, 'climb': 0.0}, separators=(',', ':')))
+        stream.append(dumps({
+            'class': 'SKY', 'device': '/dev/ttyACM0', 'hdop': 0.9,
+            'satellites': [{'PRN': p, 'el': 45, 'az': 180, 'ss': 30,
+                            'used': True} for p in range(24)]},
+            separators=(',', ':')))
+    data = ('\r\n'.join(stream) + '\r\n').encode()
+    chunks = []
+    i = 0
+    while i < len(data):
+        n = rnd.randrange(200, 2048)
+        chunks.append(data[i:i + n])
+        i += n
+
+    def before():
+        # loads() of each whole recv, as the model did
+        n = 0
+        for c in chunks:
+            for _ in c.strip().split(b'\n'):
+                try:
+                    loads(c)
+                    n += 1
+                except JSONDecodeError:
+                    pass
+        return n
+
+    def framed():
+        r = LineReader()
+        return [report(line) for c in chunks for line in r.feed(c)]
+
+    reports = [i for i in framed() if i is not None]
+    full = [loads(i) for i in stream if i.startswith('{"class":"TPV"')]
+    assert reports == [{k: j[k] for k in ('class', 'lat', 'lon', 'time')}
+                       for j in full]
+    print(f'{len(chunks)} reads, before: {before()} reports decoded,'
+          f' framed: {len(reports)} TPV of {len(stream)} reports')
+    N = 20
+    for name, fn in (('before', before), ('framed', framed)):
+        s = timeit(fn, number=N)
+        print(f'{name:7} {N * len(chunks) / s:10,.0f} reads/sec,'
+              f' {N * len(stream) / s:10,.0f} reports/sec')
+    s = timeit(lambda: [loads(i) for i in stream], number=N)
+    print(f'loads   {N * len(stream) / s:10,.0f} reports/sec'
+          f' (every line fully parsed)')
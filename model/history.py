@@ -0,0 +1,224 @@
+"""recent decode cycles, for heard-station queries"""
+from array import array
+from bisect import insort
+from collections import deque, namedtuple
+
+DAY_MS = 86_400_000
+NO_GRID = 0xFFFF
+
+Heard = namedtuple('Heard', ('call', 'time', 'snr', 'band', 'kind', 'grid'))
+
+def grid_code(grid):
+    """ 4 character grid as 0 .. 32399, NO_GRID if none """
+    if len(grid) < 4:
+        return NO_GRID
+    return (((ord(grid[0]) - 65) * 18 + ord(grid[1]) - 65) * 100
+            + int(grid[2:4]))
+
+def grid_text(code):
+    if code == NO_GRID:
+        return ''
+    f, s = divmod(code, 100)
+    a, b = divmod(f, 18)
+    return f'{chr(a + 65)}{chr(b + 65)}{s:02d}'
+
+def cycle_key(c):
+    return c.key
+
+class Cycle:
+    """
+    the decodes of one T/R period, one array per field, key is the time
+    on a clock that does not wrap at midnight, ids the calls in it
+    """
+    __slots__ = ('time', 'key', 'ids', 'call', 'snr', 'band', 'kind', 'grid')
+
+    def __init__(self, time, key):
+        self.time = time
+        self.key = key
+        self.ids = set()
+        self.call = array('I')
+        self.snr = array('b')
+        self.band = array('H')
+        self.kind = array('B')
+        self.grid = array('H')
+
+    def __len__(self):
+        return len(self.call)
+
+class History:
+    """
+    the last `cycles` T/R periods, callsigns are interned (one str per
+    call while it is in some cycle) and indexed by the cycles they are in,
+    memory stays flat however long it runs
+
+    cycles are kept in time order, with several WSJT-X instances (FT8 and
+    FT4) a cycle can arrive after a later one, the oldest is evicted
+    """
+    def __init__(self, cycles):
+        self.cycles = deque()
+        self.maxlen = cycles
+        self.by_key = {}
+        self.newest = None
+        # interned calls: call -> id, id -> call, free ids
+        self.ids = {}
+        self.names = []
+        self.free = []
+        # call id -> cycles it was heard in, oldest first
+        self.index = {}
+
+    def intern(self, call):
+        try:
+            return self.ids[call]
+        except KeyError:
+            if self.free:
+                i = self.free.pop()
+                self.names[i] = call
+            else:
+                i = len(self.names)
+                self.names.append(call)
+            self.ids[call] = i
+            self.index[i] = deque()
+            return i
+
+    def key(self, time):
+        """ ms after midnight as the cycle key nearest the newest cycle """
+        if self.newest is None:
+            return time
+        k = time + self.newest - self.newest % DAY_MS
+        if k - self.newest > DAY_MS // 2:
+            k -= DAY_MS
+        elif self.newest - k > DAY_MS // 2:
+            k += DAY_MS
+        return k
+
+    def cycle(self, time):
+        """
+        Cycle for time, a new one evicts the oldest, None if it is older
+        than every cycle kept
+        """
+        key = self.key(time)
+        try:
+            return self.by_key[key]
+        except KeyError:
+            cycles = self.cycles
+            if len(cycles) >= self.maxlen:
+                if key < cycles[0].key:
+                    return None
+                self.evict()
+            c = self.by_key[key] = Cycle(time, key)
+            if not cycles or key > cycles[-1].key:
+                cycles.append(c)
+                self.newest = key
+            else:
+                insort(cycles, c, key=cycle_key)
+            return c
+
+    def evict(self):
+        c = self.cycles.popleft()
+        del self.by_key[c.key]
+        for i in c.ids:
+            # c is the oldest cycle kept, so the first of each call in it
+            cycles = self.index[i]
+            cycles.popleft()
+            if not cycles:
+                # last reference to the call
+                del self.index[i]
+                del self.ids[self.names[i]]
+                self.names[i] = None
+                self.free.append(i)
+
+    def add(self, time, call, snr, band, kind, grid=''):
+        c = self.cycle(time)
+        if c is None:
+            return
+        i = self.intern(call)
+        if i not in c.ids:
+            c.ids.add(i)
+            cycles = self.index[i]
+            if not cycles or c.key > cycles[-1].key:
+                cycles.append(c)
+            else:
+                insort(cycles, c, key=cycle_key)
+        c.call.append(i)
+        c.snr.append(max(-128, min(127, snr)))
+        c.band.append(band)
+        c.kind.append(kind)
+        c.grid.append(grid_code(grid))
+
+    def row(self, c, n):
+        return Heard(self.names[c.call[n]], c.time, c.snr[n], c.band[n],
+                     c.kind[n], grid_text(c.grid[n]))
+
+    def rows(self, c):
+        return tuple(self.row(c, n) for n in range(len(c)))
+
+    def heard(self, call, band=None):
+        """ every time call was heard, newest first """
+        i = self.ids.get(call)
+        if i is None:
+            return
+        for c in reversed(self.index[i]):
+            calls = c.call
+            for n in range(len(calls) - 1, -1, -1):
+                if calls[n] == i and (band is None or c.band[n] == band):
+                    yield self.row(c, n)
+
+    def last_heard(self, call, band=None):
+        """ Heard or None """
+        return next(self.heard(call, band), None)
+
+    def last_grid(self, call):
+        for h in self.heard(call):
+            if h.grid > '':
+                return h.grid
+        return ''
+
+    def cycle_rows(self, time):
+        """ decodes of the cycle at time """
+        c = self.by_key.get(self.key(time))
+        return () if c is None else self.rows(c)
+
+    def recent(self, kind, ms, band=None):
+        """ calls heard as kind in the last ms, newest first """
+        seen = {}
+        if self.cycles:
+            now = self.newest
+            for c in reversed(self.cycles):
+                if now - c.key > ms:
+                    break
+                kinds = c.kind
+                for n in range(len(kinds)):
+                    if (kinds[n] == kind and c.call[n] not in seen
+                            and (band is None or c.band[n] == band)):
+                        seen[c.call[n]] = self.row(c, n)
+        return tuple(seen.values())
+
+    def __len__(self):
+        return len(self.ids)
+
+
+if __name__ == '__main__':
+    # a full day of FT8 cycles, 30 decodes each from 5000 calls
+    import tracemalloc
+    from random import Random
+    from timeit import timeit
+
+    rnd = Random(1)
+    calls = [f'K{i}ABC' for i in range(5000)]
+    h = History(240)
+    tracemalloc.start()
+    for cycle in range(5760):
+        t = cycle * 15_000
+        for _ in range(30):
+            h.add(t, rnd.choice(calls), rnd.randrange(-24, 20), 14,
+                  rnd.randrange(4), 'FN42')
+        if cycle in (240, 1000, 5759):
+            print(f'cycle {cycle:5}: {len(h):5} calls,'
+                  f' {tracemalloc.get_traced_memory()[0]:10,} bytes')
+    tracemalloc.stop()
+    print(h.last_heard(h.names[h.cycles[-1].call[0]]))
+    N = 10_000
+    s = timeit(lambda: h.last_heard(rnd.choice(calls), 14), number=N)
+    print(f'last_heard {N / s:12,.0f} lookups/sec')
+    s = timeit(lambda: h.recent(0, 10 * 60_000), number=100)
+    print(f'recent 10 min {100 / s:12,.0f} queries/sec')
@@ -0,0 +1,109 @@
+"""bounded queues between the network threads and the model"""
+from enum import Enum, auto
+from queue import Queue, Full, Empty
+from threading import Thread
+from time import perf_counter
+from traceback import print_exc
+
+class Overflow(Enum):
+    BLOCK = auto()        # wait for room, never drop
+    DROP_OLDEST = auto()  # make room by dropping the oldest queued item
+                          # that is not critical
+    DROP_NEWEST = auto()  # drop the item being queued
+
+class IngestQueue:
+    """
+    bounded queue of raw payloads drained by one worker thread,
+    critical(data) -> True marks payloads that are never dropped,
+    idle() is called after timeout seconds with nothing queued
+    """
+    def __init__(self, name, process, maxsize, overflow, critical=None,
+                 idle=None, timeout=None):
+        self.name = name
+        self.queue = Queue(maxsize)
+        self.process = process
+        self.overflow = overflow
+        self.critical = critical
+        self.idle = idle
+        self.timeout = timeout if idle is not None else None
+        self.thread = Thread(target=self.run, name=name, daemon=True)
+        self.queued = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.processed = 0
+        self.wait = 0.0
+        self.max_wait = 0.0
+
+    def start(self):
+        if not self.thread.is_alive():
+            self.thread.start()
+
+    def stop(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+    def put(self, data):
+        critical = self.critical is not None and self.critical(data)
+        item = (perf_counter(), data, critical)
+        q = self.queue
+        if self.overflow is Overflow.BLOCK or critical:
+            q.put(item)
+        else:
+            while True:
+                try:
+                    q.put_nowait(item)
+                    break
+                except Full:
+                    self.dropped += 1
+                    if (self.overflow is Overflow.DROP_NEWEST
+                            or not self.evict()):
+                        return
+        self.queued += 1
+        if (depth := q.qsize()) > self.max_depth:
+            self.max_depth = depth
+
+    def evict(self):
+        """ drop the oldest item that is not critical, False if none """
+        q = self.queue
+        with q.mutex:
+            for n, item in enumerate(q.queue):
+                if item is not None and not item[2]:
+                    del q.queue[n]
+                    return True
+        return False
+
+    def run(self):
+        get = self.queue.get
+        while True:
+            try:
+                item = get(timeout=self.timeout)
+            except Empty:
+                try:
+                    self.idle()
+                except Exception:
+                    print_exc()
+                continue
+            if item is None:
+                break
+            t, data, _ = item
+            wait = perf_counter() - t
+            self.wait += wait
+            if wait > self.max_wait:
+                self.max_wait = wait
+            try:
+                self.process(data)
+            except Exception:
+                # keep the worker alive, a bad payload only loses itself
+                print_exc()
+            self.processed += 1
+
+    def stats(self):
+        n = self.processed
+        return {'depth': self.queue.qsize(),
+                'max_depth': self.max_depth,
+                'queued': self.queued,
+                'dropped': self.dropped,
+                'processed': self.processed,
+                'mean_wait': self.wait / n if n else 0.0,
+                'max_wait': self.max_wait}
@@ -1,8 +1,8 @@
 import os
 import sys
-from queue import Queue, Empty
-from threading import Lock
-from json import loads, JSONDecodeError
+from collections import deque
+from statistics import median
+from time import time
 from datetime import datetime, timezone
 
 # '2024-03-22T12:43:35.000Z'
@@ -14,35 +14,80 @@ try:
     from utility import grid_square, timefromgps, todec, settimefromgps
     from event import ProcessID, Callback
     from tx_msg import heartbeat, reply, halt_tx, location
-    from rx_msg import parse
+    from rx_msg import peek, msg_id
+    from ingest import IngestQueue, Overflow
+    from ft8_msg import classify, Kind
+    from ranking import Ranker, TopK
+    from history import History
+    from gpsd import report
 except ModuleNotFoundError:
     from model.settings import Settings
     from model.wsjtx_db import WsjtxDb
     from model.utility import grid_square, timefromgps, todec, settimefromgps
     from model.event import ProcessID, Callback
     from model.tx_msg import heartbeat, reply, halt_tx, location
-    from model.rx_msg import parse
+    from model.rx_msg import peek, msg_id
+    from model.ingest import IngestQueue, Overflow
+    from model.ft8_msg import classify, Kind
+    from model.ranking import Ranker, TopK
+    from model.history import History
+    from model.gpsd import report
 
 APP_NAME = 'wsjtx-udp'
 
+# call list index in WsjtxInstance.calls, QSO is kept in History only
+POTA, CALL, CQ, QSO = range(4)
+
+def seconds_since(ms):
+    """ seconds since ms, milliseconds after midnight UTC """
+    return (time() * 1000 - ms) % 86_400_000 / 1000
+
+class WsjtxInstance:
+    """ state of one WSJT-X instance, keyed by its client id """
+    __slots__ = ('id_', 'band', 'mode', 'ordinal', 'de_call',
+                 'cycle', 'calls', 'finalized', 'first_display',
+                 'display_times', 'k')
+
+    def __init__(self, id_, k):
+        self.id_ = id_
+        self.k = k
+        self.band = 0
+        self.mode = None
+        self.ordinal = 0
+        self.de_call = ''
+        # seconds from the start of the T/R period to the first call shown
+        self.display_times = deque(maxlen=240)
+        self.new_cycle(None)
+
+    def new_cycle(self, cycle):
+        self.cycle = cycle
+        # pota, call, cq, the best k of each as the decodes arrive
+        self.calls = (TopK(self.k), TopK(self.k), TopK(self.k))
+        self.finalized = False
+        self.first_display = None
+
+    def update_status(self, d):
+        self.band = d.dial_freq // 1_000_000
+        n = datetime.now(timezone.utc)
+        self.ordinal = n.toordinal()
+        self.de_call = d.de_call.upper()
+        self.mode = d.mode
+
 class _Model:
     def  __init__(self):
         self.get_platform()
         self.message = ''
         self.grid = None
-        self.band = 0
-        self.mode = None
-        self.ordinal = 0
-        self.de_call = ''
         self.update_time_request = False
-        
-        self.r = []
+
+        self.instances = {}
         self.calc_data_paths()
         self.settings = Settings(self.inin)
         self.wsjtx_db = WsjtxDb(self)
-        self.lock = Lock()
+        self.ranker = Ranker(self)
+        self.history = History(self.history_cycles)
         self.running = True
-        self.queue = Queue()
+        self.ingest = self.create_ingest()
         self._event_listeners = {}
         self.platform = self.get_platform()
 
@@ -73,6 +118,7 @@ class _Model:
         if not os.path.exists(df):
             os.makedirs(df)
 
+        self.data_folder = df
         self.dbn = os.path.join(df, APP_NAME + '.sqlite')
         self.adifn = os.path.join(df, APP_NAME + '.adi')
         self.inin = os.path.join(df, APP_NAME + '.ini')
@@ -112,45 +158,66 @@ class _Model:
             pass
 
     def save_main_window_position(self, x, y):
-        self.settings.config['default']['main_x'] = str(x)
-        self.settings.config['default']['main_y'] = str(y)
+        self.settings.update(main_x=x, main_y=y)
 
     @property
     def main_window_x(self):
-        return int(self.settings.config['default']['main_x'])
+        return self.settings.main_x
 
     @main_window_x.setter
     def main_window_x(self, value):
-        self.settings.config['default']['main_x'] = str(value)
+        self.settings.update(main_x=value)
 
     @property
     def main_window_y(self):
-        return int(self.settings.config['default']['main_y'])
+        return self.settings.main_y
 
     @main_window_y.setter
     def main_window_y(self, value):
-        self.settings.config['default']['main_y'] = str(value)
+        self.settings.update(main_y=value)
 
     @property
     def theme(self):
-        return self.settings.config['default']['theme']
+        return self.settings.theme
 
     @property
     def park(self):
-        return self.settings.config['default']['park']
+        return self.settings.park
 
     @park.setter
     def park(self, value):
-        self.settings.config['default']['park'] = value
+        self.settings.update(park=value)
+
+    def instance(self, id_):
+        try:
+            return self.instances[id_]
+        except KeyError:
+            i = self.instances[id_] = WsjtxInstance(id_, self.rank_k)
+            return i
+
+    def send_wsjtx(self, id_, data):
+        """ send to the WSJT-X instance id_ """
+        self.trigger_event(Callback.WSJTX_SEND, (id_, data))
 
     def do_call(self, msg):
-        """ activate call in WSJT-X """
-        self.trigger_event(Callback.WSJTX_SEND, reply(msg))
+        """ activate call in the WSJT-X instance that decoded it """
+        self.send_wsjtx(msg.id_, reply(msg))
+
+    def worked_before(self, scope, dx_call, id_):
+        """
+        dx_call worked within scope (wsjtx_db.Scope), band, mode and day
+        of the WSJT-X instance id_, the current park and shift
+        """
+        i = self.instance(id_)
+        return self.wsjtx_db.worked_before(
+            scope, dx_call, band=i.band, mode=i.mode, ordinal_on=i.ordinal,
+            park=self.park, shift=self.shift)
 
     def abort_tx(self):
-        """ abort Tx in WSJT-X """
-        self.trigger_event(Callback.WSJTX_SEND, halt_tx(True))
-        self.trigger_event(Callback.WSJTX_SEND, halt_tx(False))
+        """ abort Tx in every WSJT-X instance """
+        for id_ in tuple(self.instances):
+            self.send_wsjtx(id_, halt_tx(True, id_))
+            self.send_wsjtx(id_, halt_tx(False, id_))
 
     def set_time(self):
         """ set current system time to GPS time """
@@ -158,20 +225,50 @@ class _Model:
 
     @property
     def shift(self):
-        return self.settings.config['default']['shift']
+        return self.settings.shift
 
     @shift.setter
     def shift(self, value):
-        self.settings.config['default']['shift'] = value
+        self.settings.update(shift=value)
 
     def set_grid(self):
         """ set WSJT-X grid to GPS grid """
         if self.grid is not None:
             self.settings.grid = self.grid
-            self.trigger_event(Callback.WSJTX_SEND, location(self.grid))
+            for id_ in tuple(self.instances):
+                self.send_wsjtx(id_, location(self.grid, id_))
 
     def set_park(self, park):
-        self.settings.config['default']['park'] = park
+        self.settings.update(park=park)
+
+    def create_ingest(self):
+        size = self.ingest_size
+        gps = Overflow[self.gps_overflow.upper()]
+        return {
+            ProcessID.GPS: IngestQueue(
+                'gps', self.process_gps, size, gps),
+            ProcessID.GPS_SERIAL: IngestQueue(
+                'gps_serial', self.process_gps_serial, size, gps),
+            ProcessID.WSJTX: IngestQueue(
+                'wsjtx', self.process_wsjtx, size,
+                Overflow[self.wsjtx_overflow.upper()],
+                # LOG and ADIF are never dropped
+                lambda d: msg_id(d) in (5, 12)),
+        }
+
+    def start(self):
+        for i in self.ingest.values():
+            i.start()
+
+    def submit(self, id_, data):
+        """
+        called by the network threads, data is copied (it may be a view
+        of a receive buffer) and processed by the worker for id_
+        """
+        self.ingest[id_].put(bytes(data))
+
+    def ingest_stats(self):
+        return {i.name: i.stats() for i in self.ingest.values()}
 
     def process(self, id_, data):
         match id_:
@@ -182,37 +279,36 @@ class _Model:
             case ProcessID.WSJTX:
                 self.process_wsjtx(data)
 
-    def process_gps(self, data):
-        for d in data.strip().split(b'\n'):
-            try:
-                j = loads(data)
-                match j['class']:
-                    case 'VERSION':
-                        self.trigger_event(
-                            Callback.GPS_SEND,
-                            b'?WATCH={"enable":true,"json":true}')
-                    case 'TPV':
-                        if self.message > '':
-                            self.trigger_event('gps_decode', self.message)
-                            self.message = ''
-                        else:
-                            if 'lat' in j:
-                                grid = grid_square(j['lon'], j['lat'])[:6]
-                                self.grid = grid
-                            else:
-                                grid = None
-                            if 'time' in j:
-                                t = j['time']
-                                if t.endswith('Z'):
-                                    t = t[:-1] + '+00:00'
-                                time = datetime.fromisoformat(t).time()
-                            else:
-                                time = None
-                            self.trigger_event(
-                                Callback.GPS_DECODE,
-                                {'time': time, 'grid': grid})
-            except JSONDecodeError:
-                pass
+    def process_gps(self, line):
+        """ one gpsd report line """
+        j = report(line)
+        if j is None:
+            return
+        match j['class']:
+            case 'VERSION':
+                self.trigger_event(
+                    Callback.GPS_SEND,
+                    b'?WATCH={"enable":true,"json":true}')
+            case 'TPV':
+                if self.message > '':
+                    self.trigger_event('gps_decode', self.message)
+                    self.message = ''
+                else:
+                    if 'lat' in j and 'lon' in j:
+                        grid = grid_square(j['lon'], j['lat'])[:6]
+                        self.grid = grid
+                    else:
+                        grid = None
+                    if 'time' in j:
+                        t = j['time']
+                        if t.endswith('Z'):
+                            t = t[:-1] + '+00:00'
+                        time = datetime.fromisoformat(t).time()
+                    else:
+                        time = None
+                    self.trigger_event(
+                        Callback.GPS_DECODE,
+                        {'time': time, 'grid': grid})
 
     def process_gps_serial(self, data):
         a = data.decode().strip().split(',')
@@ -241,82 +337,152 @@ class _Model:
                         {'time': f'{tm[0]:02d}:{tm[1]:02d}:{tm[2]:02d}',
                          'grid': self.grid})
 
-    def process_decodes(self):
-        if len(self.r) == 0:
-            return
-        pota = []
-        cq = []
-        call = []
-        for i in self.r:
-            dx_call = None
-            msg_parse = i.message.split(' ')
-            if msg_parse[0] == 'CQ':
-                if msg_parse[1] == 'POTA':
-                    dx_call = msg_parse[2]
-                    append = pota
-                else:
-                    dx_call = msg_parse[1]
-                    append = cq
-            elif msg_parse[0] == self.de_call:
-                dx_call = msg_parse[1]
-                append = call
-            else:
-                continue
-            if dx_call is not None:    
-                if self.wsjtx_db.exists(dx_call, i) == 0:
-                    append.append(i)                   
-        pota.sort(key=lambda a: a.snr, reverse=True)
-        call.sort(key=lambda a: a.snr, reverse=True)
-        cq.sort(key=lambda a: a.snr, reverse=True)
-        self.trigger_event(Callback.WSJTX_CALLS, (pota, call, cq))
-
-
-    def update_status(self, d):
-        self.band = d.dial_freq // 1_000_000
-        n = datetime.now(timezone.utc)
-        self.ordinal = n.toordinal()
-        self.de_call = d.de_call.upper()
-        if self.grid is None:
-            self.grid = d.de_grid
-        self.mode = d.mode
+    def process_decode(self, inst, d):
+        """ classify one decode and add it to the call lists at once """
+        if d.time != inst.cycle:
+            inst.new_cycle(d.time)
+        m = classify(d.message, inst.de_call)
+        match m.kind:
+            case Kind.CQ:
+                n = POTA if m.target == 'POTA' else CQ
+            case Kind.TO_ME:
+                n = CALL
+            case Kind.QSO:
+                n = QSO
+            case _:
+                return
+        if n != QSO and self.wsjtx_db.exists(m.dx_call, d) == 0:
+            inst.calls[n].push(self.ranker.rank(d, m))
+            if inst.first_display is None:
+                inst.first_display = seconds_since(d.time)
+            self.trigger_event(
+                Callback.WSJTX_CALLS,
+                (inst.id_, *(i.ranked() for i in inst.calls)))
+        self.history.add(d.time, m.dx_call, d.snr, inst.band, n, m.grid[-4:])
+
+    def process_decodes(self, batch):
+        """ the rows of a DecodeBatch (rx_msg.parse_many), in order """
+        for n in range(len(batch)):
+            d = batch[n]
+            self.process_decode(self.instance(d.id_), d)
+
+    def finalize_cycle(self, inst):
+        if inst.first_display is not None and not inst.finalized:
+            inst.display_times.append(inst.first_display)
+            # (id_, seconds to the first call shown, median of recent)
+            self.trigger_event(
+                Callback.WSJTX_CYCLE,
+                (inst.id_, inst.first_display, median(inst.display_times)))
+        inst.finalized = True
+
+    def display_stats(self):
+        """ time to first display in each recent cycle, per instance """
+        return {i.id_: tuple(i.display_times)
+                for i in tuple(self.instances.values())}
 
 
     def process_wsjtx(self, data):
-        d = parse(data)
+        # only the header is read here, payloads of the messages
+        # handled below are decoded on demand, all others never
+        d = peek(data)
         msg_id = d.msg_id
         match msg_id:
             case 0:  # HEARTBEAT
-                self.trigger_event(Callback.WSJTX_SEND, heartbeat())
+                self.send_wsjtx(d.id_, heartbeat(d.id_))
             case 1:  # STATUS
-                self.update_status(d)
+                d = d.record
+                i = self.instance(d.id_)
+                i.update_status(d)
+                if self.grid is None:
+                    self.grid = d.de_grid
                 self.trigger_event(Callback.WSJTX_STATUS, d)
                 if not d.decoding:
-                    self.process_decodes()
-                    self.r = []
+                    self.finalize_cycle(i)
             case 2:  # DECODE
-                self.r.append(d)
+                self.process_decode(self.instance(d.id_), d.record)
             case 5:  # LOG
-                self.wsjtx_db.add(d)
+                self.wsjtx_db.add(d.record)
+            case 6:  # CLOSE
+                if self.instances.pop(d.id_, None) is not None:
+                    self.trigger_event(Callback.WSJTX_CLOSE, d.id_)
             case 12:  # ADIF
                 self.wsjtx_db.add_log(d.text)
 
     @property
     def wsjtx_address(self):
-        return (self.settings.config['default']['wsjtx_host'],
-                int(self.settings.config['default']['wsjtx_port']))
+        return (self.settings.wsjtx_host, self.settings.wsjtx_port)
+
+    @property
+    def wsjtx_engine(self):
+        """ 'thread' (blocking socket) or 'asyncio' """
+        return self.settings.wsjtx_engine
+
+    @property
+    def wsjtx_rcvbuf(self):
+        """ SO_RCVBUF for the WSJT-X socket, 0 keeps the OS default """
+        return self.settings.wsjtx_rcvbuf
+
+    @property
+    def relay_destinations(self):
+        """
+        'host:port, host:port' to forward WSJT-X datagrams to, entries
+        without a host or a valid port are skipped
+        """
+        r = []
+        for i in self.settings.relay.split(','):
+            host, _, port = i.strip().rpartition(':')
+            try:
+                port = int(port)
+            except ValueError:
+                continue
+            if host > '' and 0 < port < 65536:
+                r.append((host, port))
+        return r
+
+    @property
+    def ingest_size(self):
+        """ maximum payloads queued per source """
+        return self.settings.ingest_size
+
+    @property
+    def rank_k(self):
+        """ rows kept in each call list """
+        return self.settings.rank_k
+
+    @property
+    def history_cycles(self):
+        """ T/R periods of decodes kept for heard queries """
+        return self.settings.history_cycles
+
+    @property
+    def gps_overflow(self):
+        """ block, drop_oldest or drop_newest """
+        return self.settings.gps_overflow
+
+    @property
+    def wsjtx_overflow(self):
+        """ block, drop_oldest or drop_newest (not LOG/ADIF) """
+        return self.settings.wsjtx_overflow
+
+    @property
+    def capture_file(self):
+        """ raw WSJT-X datagram capture, relative to the data folder """
+        c = self.settings.capture
+        return os.path.join(self.data_folder, c) if c > '' else ''
 
     @property
     def gps_address(self):
-        return (self.settings.config['rpi']['gps_host'],
-                int(self.settings.config['rpi']['gps_port']))
+        return (self.settings.gps_host, self.settings.gps_port)
 
     @property
     def gps_serial_address(self):
-        return self.settings.config['win32']['gps_port']
+        return self.settings.gps_serial_port
 
 
     def close(self):
         self.running = False
+        for i in self.ingest.values():
+            i.stop()
         self.settings.save()
         self.wsjtx_db.close()
         # print('model closed')
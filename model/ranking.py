@@ -0,0 +1,161 @@
+"""rank decodes for the call lists, keeping only the best K"""
+from collections import namedtuple
+from functools import lru_cache
+from heapq import heappush, heappushpop
+from itertools import count
+from math import radians, sin, cos, asin, sqrt
+
+try:
+    from utility import lon_lat
+except ModuleNotFoundError:
+    from model.utility import lon_lat
+
+# one row of a call list, components is a tuple of (name, points)
+Ranked = namedtuple('Ranked', ('score', 'components', 'd'))
+
+EARTH_KM = 6371.0
+DAY_MS = 86_400_000
+# a call not heard for this long counts as new
+HEARD_CAP_MS = 10 * 60_000
+
+@lru_cache(maxsize=4096)
+def distance_km(a, b):
+    """ great circle distance between two grid squares """
+    lon1, lat1 = map(radians, lon_lat(a))
+    lon2, lat2 = map(radians, lon_lat(b))
+    h = (sin((lat2 - lat1) / 2) ** 2
+         + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_KM * asin(sqrt(h))
+
+# scorers: fn(ranker, d, m, grid, gap) -> value, multiplied by the weight
+# d is the Decode, m the ft8_msg.Parsed, grid the best known grid of
+# m.dx_call ('' if none), gap ms since the call was last heard (History)
+
+def snr(r, d, m, grid, gap):
+    """ dB """
+    return d.snr
+
+def new_grid(r, d, m, grid, gap):
+    """ 1 if the grid was never worked """
+    return int(grid > '' and grid[:4] not in r.model.wsjtx_db.grids)
+
+def distance(r, d, m, grid, gap):
+    """ 1000 km """
+    my_grid = r.model.grid
+    if grid > '' and my_grid:
+        return distance_km(my_grid[:4], grid[:4]) / 1000
+    return 0
+
+def heard(r, d, m, grid, gap):
+    """ minutes since last heard, up to 10 (first time heard) """
+    return min(gap, HEARD_CAP_MS) / 60_000
+
+def worked(r, d, m, grid, gap):
+    """ 1 if worked before at all """
+    return int(m.dx_call in r.model.wsjtx_db.calls)
+
+# name: (fn, weight)
+SCORERS = {
+    'snr': (snr, 1.0),
+    'grid': (new_grid, 10.0),
+    'dist': (distance, 1.0),
+    'heard': (heard, 0.5),
+    'worked': (worked, -5.0),
+}
+
+class TopK:
+    """ the K best Ranked seen, a min-heap so the worst is dropped """
+    __slots__ = ('k', 'heap', 'seq')
+
+    def __init__(self, k):
+        self.k = k
+        self.heap = []
+        self.seq = count()
+
+    def push(self, ranked):
+        # seq breaks ties, the earlier decode stays ahead
+        e = (ranked.score, -next(self.seq), ranked)
+        if len(self.heap) < self.k:
+            heappush(self.heap, e)
+        else:
+            heappushpop(self.heap, e)
+
+    def ranked(self):
+        """ best first """
+        return tuple(i[2] for i in sorted(self.heap, reverse=True))
+
+    def __len__(self):
+        return len(self.heap)
+
+class Ranker:
+    def __init__(self, model, scorers=None):
+        self.model = model
+        self.scorers = dict(SCORERS if scorers is None else scorers)
+
+    def register(self, name, fn, weight=1.0):
+        """ add or replace a score component """
+        self.scorers[name] = (fn, weight)
+
+    def rank(self, d, m):
+        """ Ranked for decode d of Parsed m, before it is in History """
+        history = self.model.history
+        h = history.last_heard(m.dx_call)
+        gap = HEARD_CAP_MS if h is None else (d.time - h.time) % DAY_MS
+        grid = m.grid[-4:] if m.grid > '' else history.last_grid(m.dx_call)
+        components = tuple(
+            (name, round(fn(self, d, m, grid, gap) * weight, 1) + 0.0)
+            for name, (fn, weight) in self.scorers.items())
+        return Ranked(round(sum(i[1] for i in components), 1),
+                      components, d)
+
+
+if __name__ == '__main__':
+    # ranking cost per decode, full sort of every decode vs top-K heap
+    from random import Random
+    from timeit import timeit
+    from types import SimpleNamespace
+    from bisect import insort
+    try:
+        from history import History
+    except ModuleNotFoundError:
+        from model.history import History
+
+    rnd = Random(1)
+    model = SimpleNamespace(
+        grid='EN80', wsjtx_db=SimpleNamespace(calls=set(), grids=set()),
+        history=History(240))
+    r = Ranker(model)
+    grids = [f'{a}{b}{c}{d}' for a in 'CDEF' for b in 'LMN'
+             for c in '0123456789' for d in '0123456789']
+    decodes = []
+    for i in range(5000):
+        grid = rnd.choice(grids)
+        d = SimpleNamespace(snr=rnd.randrange(-24, 20), time=i * 15,
+                            message='')
+        m = SimpleNamespace(dx_call=f'K{rnd.randrange(2000)}AB', grid=grid)
+        decodes.append((d, m))
+    print(r.rank(*decodes[0]))
+
+    def ranked():
+        for d, m in decodes:
+            r.rank(d, m)
+            model.history.add(d.time, m.dx_call, d.snr, 14, 0, m.grid)
+
+    N = 5
+    s = timeit(ranked, number=N)
+    print(f'score      {N * len(decodes) / s:12,.0f} decodes/sec')
+    rows = [r.rank(d, m) for d, m in decodes]
+    for n in (100, 1000, 5000):
+        def sorted_list():
+            a = []
+            for i in rows[:n]:
+                insort(a, i, key=lambda i: -i.score)
+        def heap():
+            a = TopK(50)
+            for i in rows[:n]:
+                a.push(i)
+            return a.ranked()
+        s1 = timeit(sorted_list, number=N) / N
+        s2 = timeit(heap, number=N) / N
+        print(f'{n:5} per cycle: insort {s1 * 1000:6.2f} ms,'
+              f' top-50 heap {s2 * 1000:6.2f} ms')
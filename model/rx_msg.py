@@ -1,4 +1,6 @@
-from struct import unpack_from, calcsize
+from array import array
+from struct import Struct, error as struct_error
+from collections import namedtuple
 from datetime import datetime, timedelta, timezone
 
 def to_datetime(jday, msec, timespec, offset):
@@ -7,195 +9,629 @@ def to_datetime(jday, msec, timespec, offset):
         case 0:
             dt = dt.astimezone()
         case 1|2:
-            dt = dt.replace(tzinfo=timezone(timedelta(seconds=offset)))    
+            dt = dt.replace(tzinfo=timezone(timedelta(seconds=offset)))
     return dt
 
+# fixed width fields are struct format characters, consecutive runs
+# of them are merged into one precompiled Struct per message type
+
+qbool = '?'
+qint8 = 'b'
+quint8 = 'B'
+quint16 = 'H'
+qint32 = 'i'
+quint32 = 'I'
+qint64 = 'q'
+quint64 = 'Q'
+qdouble = 'd'
+
+# variable width fields are readers: (buffer, offset) -> (value, offset)
+
+_UINT32 = Struct('>I')
+_INT32 = Struct('>i')
+_DATETIME = Struct('>Qib')
+_COLOR = Struct('>BHHHHH')
+
+def qutf8(b, o):
+    m, = _UINT32.unpack_from(b, o)
+    o += 4
+    if m == 0xffffffff or m == 0:
+        return '', o
+    e = o + m
+    return str(b[o:e], 'utf-8'), e
+
+def qdatetime(b, o):
+    jday, msec, ts = _DATETIME.unpack_from(b, o)
+    o += _DATETIME.size
+    if ts == 2:
+        offset, = _INT32.unpack_from(b, o)
+        o += 4
+    else:
+        offset = 0
+    return (jday, msec, ts, offset), o
+
+def qcolor(b, o):
+    return _COLOR.unpack_from(b, o), o + _COLOR.size
+
+HEADER_FIELDS = (('magic',  quint32),
+                 ('schema', quint32),
+                 ('msg_id', quint32),
+                 ('id_',    qutf8))
+
+DECODE_FIELDS = (
+    #HEARTBEAT
+    (('max_schema', quint32),
+    ('version',     qutf8),
+    ('revision',    qutf8)),
+
+    #STATUS
+    (('dial_freq',   quint64),
+    ('mode',         qutf8),
+    ('dx_call',      qutf8),
+    ('report',       qutf8),
+    ('tx_mode',      qutf8),
+    ('tx_enabled',   qbool),
+    ('transmitting', qbool),
+    ('decoding',     qbool),
+    ('rx_df',        quint32),
+    ('tx_df',        quint32),
+    ('de_call',      qutf8),
+    ('de_grid',      qutf8),
+    ('dx_grid',      qutf8),
+    ('tx_watchdog',  qbool),
+    ('sub_mode',     qutf8),
+    ('fast_mode',    qbool),
+    ('spec_mode',    quint8),
+    ('freq_tol',     quint32),
+    ('tr_period',    quint32),
+    ('conf_name',    qutf8),
+    ('tx_msg',       qutf8)),
+
+    #DECODE
+    (('new',       qbool),
+    ('time',       quint32),
+    ('snr',        qint32),
+    ('delta_time', qdouble),
+    ('delta_freq', quint32),
+    ('mode',       qutf8),
+    ('message',    qutf8),
+    ('low_conf',   qbool),
+    ('off_air',    qbool)),
+
+    # CLEAR_FIELDS = (('window', quint8),)
+    ##def clear(a):
+    ##    if len(a.raw) > a.index:
+    ##        a.window = quint8(a)
+
+    #CLEAR
+    (),
+
+    #REPLY
+    (('time',      quint32),
+    ('snr',        qint32),
+    ('delta_time', qdouble),
+    ('delta_freq', qint32),
+    ('mode',       qutf8),
+    ('message',    qutf8),
+    ('low_conf',   qbool),
+    ('modifiers',  quint8)),
+
+    #LOG
+    (('time_off', qdatetime),
+    ('dx_call',   qutf8),
+    ('dx_grid',   qutf8),
+    ('tx_freq',   quint64),
+    ('mode',      qutf8),
+    ('rst_sent',  qutf8),
+    ('rst_recv',  qutf8),
+    ('tx_power',  qutf8),
+    ('comments',  qutf8),
+    ('name',      qutf8),
+    ('time_on',   qdatetime),
+    ('op_call',   qutf8),
+    ('my_call',   qutf8),
+    ('my_grid',   qutf8),
+    ('ex_sent',   qutf8),
+    ('ex_recv',   qutf8),
+    ('adif_md',   qutf8)),
+
+    #CLOSE
+    (),
+
+    #REPLAY
+    (),
+
+    #HALT_TX
+    (('auto_tx_only', qbool),),
+
+    #FREE_TEXT
+    (('text', qutf8),
+    ('send',  qbool)),
+
+    #WSPR
+    (('new_',      qbool),
+    ('time',       quint32),
+    ('snr',        qint32),
+    ('delta_time', qdouble),
+    ('freq',       quint64),
+    ('drift',      quint32),
+    ('callsign',   qutf8),
+    ('grid',       qutf8),
+    ('power',      qint32),
+    ('off_air',    qbool)),
+
+    #LOCATION -- note AutoGrid must be checked in WSJT-X
+    (('location', qutf8),),
+
+    #ADIF
+    (('text', qutf8),),
+
+    #HIGHLIGHT CALLSIGN
+    (('call',     qutf8),
+    ('bg',        qcolor),
+    ('fg',        qcolor),
+    ('last_only', qbool)),
+
+    #SWITCH CONFIGURATION
+    (('conf_name', qutf8),),
+
+    #CONFIGURE
+    (('mode',     qutf8),
+    ('freq_tol',  quint32),
+    ('submode',   qutf8),
+    ('fastmode',  qbool),
+    ('tr_period', quint32),
+    ('rx_df',     quint32),
+    ('dx_call',   qutf8),
+    ('dx_grid',   qutf8),
+    ('gen_msg',   qbool)),
+)
+
+def compile_fields(fields):
+    """
+    convert a field table into a tuple of steps, each step is
+    (Struct, names, None) for a run of fixed width fields or
+    (None, name, reader) for a variable width field
+    """
+    steps = []
+    run = []
+
+    def flush():
+        if run:
+            steps.append((Struct('>' + ''.join(t for _, t in run)),
+                          tuple(n for n, _ in run),
+                          None))
+            run.clear()
+
+    for n, t in fields:
+        if isinstance(t, str):
+            run.append((n, t))
+        else:
+            flush()
+            steps.append((None, n, t))
+    flush()
+    return tuple(steps)
+
+HEADER_STEPS = compile_fields(HEADER_FIELDS)
+DECODE_STEPS = tuple(compile_fields(i) for i in DECODE_FIELDS)
+
+MESSAGE_NAMES = ('Heartbeat',
+                 'Status',
+                 'Decode',
+                 'Clear',
+                 'Reply',
+                 'Log',
+                 'Close',
+                 'Replay',
+                 'HaltTx',
+                 'FreeText',
+                 'WSPR',
+                 'Location',
+                 'Adif',
+                 'HighlightCallsign',
+                 'SwitchConfiguration',
+                 'Configure')
+
+# one immutable record type (a namedtuple, so __slots__ = ()) per message
+MESSAGE_TYPES = tuple(
+    namedtuple(n, [i for i, _ in HEADER_FIELDS + f])
+    for n, f in zip(MESSAGE_NAMES, DECODE_FIELDS))
+
+(Heartbeat, Status, Decode, Clear, Reply, Log, Close, Replay, HaltTx,
+ FreeText, WSPR, Location, Adif, HighlightCallsign, SwitchConfiguration,
+ Configure) = MESSAGE_TYPES
+
+new_record = tuple.__new__
+
+def do_steps(v, b, o, steps):
+    for s, n, t in steps:
+        if t is None:
+            v.extend(s.unpack_from(b, o))
+            o += s.size
+        else:
+            x, o = t(b, o)
+            v.append(x)
+    return o
+
 def parse(d):
+    v = []
+    o = do_steps(v, d, 0, HEADER_STEPS)
+    msg_id = v[2]
+    do_steps(v, d, o, DECODE_STEPS[msg_id])
+    return new_record(MESSAGE_TYPES[msg_id], v)
+
+_HEADER = Struct('>III')
+
+class Message:
+    """
+    zero-copy view of a datagram: only the header is read up front,
+    the payload is decoded into its record on first access
+    """
+    __slots__ = ('magic', 'schema', 'msg_id', 'id_',
+                 '_buf', '_offset', '_record')
+
+    def __init__(self, d):
+        b = memoryview(d)
+        self.magic, self.schema, self.msg_id = _HEADER.unpack_from(b)
+        self.id_, self._offset = qutf8(b, _HEADER.size)
+        self._buf = b
+        self._record = None
+
+    @property
+    def record(self):
+        if self._record is None:
+            v = [self.magic, self.schema, self.msg_id, self.id_]
+            do_steps(v, self._buf, self._offset, DECODE_STEPS[self.msg_id])
+            self._record = new_record(MESSAGE_TYPES[self.msg_id], v)
+            self._buf = None
+        return self._record
+
+    def __getattr__(self, name):
+        return getattr(self.record, name)
+
+def peek(d):
+    return Message(d)
+
+def msg_id(d):
+    return _HEADER.unpack_from(d)[2]
 
-    def parse_base(a, fmt):
-        a._index = (o:=a._index) + calcsize(fmt)
-        return unpack_from(fmt, a.raw, o)[0]
-
-    qbool = lambda a: parse_base(a, '?')
-    qint8 = lambda a: parse_base(a, 'b')
-    quint8 = lambda a: parse_base(a, 'B')
-    quint16 = lambda a: parse_base(a, '>H')
-    qint32 = lambda a: parse_base(a, '>i')
-    quint32 = lambda a: parse_base(a, '>I')
-    qint64 = lambda a: parse_base(a, '>q')
-    quint64 = lambda a: parse_base(a, '>Q')
-    qdouble = lambda a: parse_base(a, '>d')
-
-    def qdatetime(a):
-        return(quint64(a),
-               qint32(a),
-               (ts := qint8(a)),
-               (qint32(a) if ts==2 else 0))
-
-    def qutf8(a):
-        i = 0 if (m:=quint32(a)) == 0xffffffff else m
-        a._index = (o:=a._index) + i
-        return '' if i == 0 else a.raw[o:a._index].decode()
-
-    def qcolor(a):
-        return (quint8(a),
-                quint16(a),
-                quint16(a),
-                quint16(a),
-                quint16(a),
-                quint16(a))
-        
-    HEADER_FIELDS = (('magic',  quint32),
-                     ('schema', quint32),
-                     ('msg_id', quint32),
-                     ('id_',    qutf8))
-
-    decode_fields = (
-        #HEARTBEAT
-        (('max_schema', quint32),
-        ('version',     qutf8),
-        ('revision',    qutf8)),
-        
-        #STATUS
-        (('dial_freq',   quint64),
-        ('mode',         qutf8),
-        ('dx_call',      qutf8),
-        ('report',       qutf8),
-        ('tx_mode',      qutf8),
-        ('tx_enabled',   qbool),
-        ('transmitting', qbool),
-        ('decoding',     qbool),
-        ('rx_df',        quint32),
-        ('rx_df',        quint32),
-        ('de_call',      qutf8),
-        ('de_grid',      qutf8),
-        ('dx_grid',      qutf8),
-        ('tx_watchdog',  qbool),
-        ('sub_mode',     qutf8),
-        ('fast_mode',    qbool),
-        ('spec_mode',    quint8),
-        ('freq_tol',     quint32),
-        ('tr_period',    quint32),
-        ('conf_name',    qutf8),
-        ('tx_msg',       qutf8)),
-
-        #DECODE
-        (('new',       qbool),
-        ('time',       quint32),
-        ('snr',        qint32),
-        ('delta_time', qdouble),
-        ('delta_freq', quint32),
-        ('mode',       qutf8),
-        ('message',    qutf8),
-        ('low_conf',   qbool),
-        ('off_air',    qbool)),
-
-        # CLEAR_FIELDS = (('window', quint8),)
-        ##def clear(a):
-        ##    if len(a.raw) > a.index:
-        ##        a.window = quint8(a)
-
-        #CLEAR
-        (),
-        
-        #REPLY
-        (('time',      quint32),
-        ('snr',        qint32),
-        ('delta_time', qdouble),
-        ('delta_freq', qint32),
-        ('mode',       qutf8),
-        ('message',    qutf8),
-        ('low_conf',   qbool),
-        ('modifiers',  quint8)),
-        
-        #LOG
-        (('time_off', qdatetime),
-        ('dx_call',   qutf8),
-        ('dx_grid',   qutf8),
-        ('tx_freq',   quint64),
-        ('mode',      qutf8),
-        ('rst_sent',  qutf8),
-        ('rst_recv',  qutf8),
-        ('tx_power',  qutf8),
-        ('comments',  qutf8),
-        ('name',      qutf8),
-        ('time_on',   qdatetime),
-        ('op_call',   qutf8),
-        ('my_call',   qutf8),
-        ('my_grid',   qutf8),
-        ('ex_sent',   qutf8),
-        ('ex_recv',   qutf8),
-        ('adif_md',   qutf8)),
-        
-        #CLOSE
-        (),
-        
-        #REPLAY
-        (),
-        
-        #HALT_TX
-        (('auto_tx_only', qbool),),
-        
-        #FREE_TEXT
-        (('text', qutf8),
-        ('send',  qbool)),
-        
-        #WSPR
-        (('new_',      qbool),
-        ('time',       quint32),
-        ('snr',        qint32),
-        ('delta_time', qdouble),
-        ('freq',       quint64),
-        ('drift',      quint32),
-        ('callsign',   qutf8),
-        ('grid',       qutf8),
-        ('power',      qint32),
-        ('off_air',    qbool)),
-
-        #LOCATION -- note AutoGrid must be checked in WSJT-X 
-        (('location', qutf8),),
-        
-        #ADIF
-        (('text', qutf8),),
-        
-        #HIGHLIGHT CALLSIGN
-        (('call',     qutf8),
-        ('bg',        qcolor),
-        ('fg',        qcolor),
-        ('last_only', qbool)),
-
-        #SWITCH CONFIGURATION
-        (('conf_name', qutf8),),
-        
-        #CONFIGURE
-        (('mode',     qutf8),
-        ('freq_tol',  quint32),
-        ('submode',   qutf8),
-        ('fastmode',  qbool),
-        ('tr_period', quint32),
-        ('rx_df',     quint32),
-        ('dx_call',   qutf8),
-        ('dx_grid',   qutf8),
-        ('gen_msg',   qbool)),
-    )
-    
-    def do_fields(a, fields):
-        for n,t in fields:
-            a.__dict__[n] = t(a)
-            
-    class Data:
-        pass
-            
-    a = Data()
-    a._index = 0
-    a.raw = d
-    do_fields(a, HEADER_FIELDS)
-    do_fields(a, decode_fields[a.msg_id])
-    del a._index
+MAGIC = 0xadbccbda
+_ID_HEAD = Struct('>IIII')
+
+def valid(d):
+    """ d is long enough for the header and client id, with WSJT-X magic """
+    if len(d) < _ID_HEAD.size:
+        return False
+    magic, _, _, m = _ID_HEAD.unpack_from(d)
+    return magic == MAGIC and (m == 0xffffffff or _ID_HEAD.size + m <= len(d))
+
+def client_id(d):
+    """ id of the WSJT-X instance that sent the datagram, None if bad """
+    try:
+        return qutf8(d, _HEADER.size)[0]
+    except (ValueError, struct_error):
+        return None
+
+(_DECODE_HEAD, _, _), _, _, (_DECODE_TAIL, _, _) = DECODE_STEPS[2]
+
+class DecodeBatch:
+    """
+    columnar batch of DECODE messages, one parallel array per field,
+    batch[i] rebuilds the Decode record for row i
+    """
+    __slots__ = ('schema', 'id_', 'new', 'time', 'snr', 'delta_time', 'delta_freq',
+                 'mode', 'message', 'low_conf', 'off_air')
+
+    def __init__(self):
+        self.schema = array('I')
+        self.id_ = []
+        self.new = array('B')
+        self.time = array('I')
+        self.snr = array('i')
+        self.delta_time = array('d')
+        self.delta_freq = array('I')
+        self.mode = []
+        self.message = []
+        self.low_conf = array('B')
+        self.off_air = array('B')
+
+    def __len__(self):
+        return len(self.time)
+
+    def __getitem__(self, i):
+        return Decode(MAGIC,
+                      self.schema[i],
+                      2,
+                      self.id_[i],
+                      bool(self.new[i]),
+                      self.time[i],
+                      self.snr[i],
+                      self.delta_time[i],
+                      self.delta_freq[i],
+                      self.mode[i],
+                      self.message[i],
+                      bool(self.low_conf[i]),
+                      bool(self.off_air[i]))
+
+def parse_many(datagrams):
+    """ decode a burst of datagrams into a DecodeBatch, non DECODE are skipped """
+    a = DecodeBatch()
+    head = _DECODE_HEAD.unpack_from
+    head_size = _DECODE_HEAD.size
+    tail = _DECODE_TAIL.unpack_from
+    for d in datagrams:
+        _, schema, msg_id = _HEADER.unpack_from(d)
+        if msg_id != 2:
+            continue
+        id_, o = qutf8(d, _HEADER.size)
+        new, time, snr, delta_time, delta_freq = head(d, o)
+        mode, o = qutf8(d, o + head_size)
+        message, o = qutf8(d, o)
+        low_conf, off_air = tail(d, o)
+        a.schema.append(schema)
+        a.id_.append(id_)
+        a.new.append(new)
+        a.time.append(time)
+        a.snr.append(snr)
+        a.delta_time.append(delta_time)
+        a.delta_freq.append(delta_freq)
+        a.mode.append(mode)
+        a.message.append(message)
+        a.low_conf.append(low_conf)
+        a.off_air.append(off_air)
     return a
 
 
 if __name__ == '__main__':
-    from sample_data.small_sample import SAMPLE_DATA
-    # a = [parse(i) for i in SAMPLE_DATA.values()]
-    a = parse(SAMPLE_DATA[12])
+    # micro-benchmark: packets/sec for the common incoming messages
+    from timeit import timeit
+    try:
+        import tx_msg as t
+    except ModuleNotFoundError:
+        import model.tx_msg as t
+
+    def build(msg_id, *fields):
+        d = []
+        t.header(d, msg_id)
+        for fn, x in fields:
+            fn(d, x)
+        return b''.join(d)
+
+    # the decoder before user-001/002, kept to compare: closures, field
+    # table and Data class rebuilt per call, one unpack per field
+    from struct import unpack_from, calcsize
+
+    def before(d):
+
+        def parse_base(a, fmt):
+            a._index = (o:=a._index) + calcsize(fmt)
+            return unpack_from(fmt, a.raw, o)[0]
+
+        qbool = lambda a: parse_base(a, '?')
+        qint8 = lambda a: parse_base(a, 'b')
+        quint8 = lambda a: parse_base(a, 'B')
+        quint16 = lambda a: parse_base(a, '>H')
+        qint32 = lambda a: parse_base(a, '>i')
+        quint32 = lambda a: parse_base(a, '>I')
+        qint64 = lambda a: parse_base(a, '>q')
+        quint64 = lambda a: parse_base(a, '>Q')
+        qdouble = lambda a: parse_base(a, '>d')
+
+        def qdatetime(a):
+            return(quint64(a),
+                   qint32(a),
+                   (ts := qint8(a)),
+                   (qint32(a) if ts==2 else 0))
+
+        def qutf8(a):
+            i = 0 if (m:=quint32(a)) == 0xffffffff else m
+            a._index = (o:=a._index) + i
+            return '' if i == 0 else a.raw[o:a._index].decode()
+
+        def qcolor(a):
+            return (quint8(a),
+                    quint16(a),
+                    quint16(a),
+                    quint16(a),
+                    quint16(a),
+                    quint16(a))
+
+        HEADER_FIELDS = (('magic',  quint32),
+                         ('schema', quint32),
+                         ('msg_id', quint32),
+                         ('id_',    qutf8))
+
+        decode_fields = (
+            #HEARTBEAT
+            (('max_schema', quint32),
+            ('version',     qutf8),
+            ('revision',    qutf8)),
+
+            #STATUS
+            (('dial_freq',   quint64),
+            ('mode',         qutf8),
+            ('dx_call',      qutf8),
+            ('report',       qutf8),
+            ('tx_mode',      qutf8),
+            ('tx_enabled',   qbool),
+            ('transmitting', qbool),
+            ('decoding',     qbool),
+            ('rx_df',        quint32),
+            ('rx_df',        quint32),
+            ('de_call',      qutf8),
+            ('de_grid',      qutf8),
+            ('dx_grid',      qutf8),
+            ('tx_watchdog',  qbool),
+            ('sub_mode',     qutf8),
+            ('fast_mode',    qbool),
+            ('spec_mode',    quint8),
+            ('freq_tol',     quint32),
+            ('tr_period',    quint32),
+            ('conf_name',    qutf8),
+            ('tx_msg',       qutf8)),
+
+            #DECODE
+            (('new',       qbool),
+            ('time',       quint32),
+            ('snr',        qint32),
+            ('delta_time', qdouble),
+            ('delta_freq', quint32),
+            ('mode',       qutf8),
+            ('message',    qutf8),
+            ('low_conf',   qbool),
+            ('off_air',    qbool)),
+
+            # CLEAR_FIELDS = (('window', quint8),)
+            ##def clear(a):
+            ##    if len(a.raw) > a.index:
+            ##        a.window = quint8(a)
+
+            #CLEAR
+            (),
+
+            #REPLY
+            (('time',      quint32),
+            ('snr',        qint32),
+            ('delta_time', qdouble),
+            ('delta_freq', qint32),
+            ('mode',       qutf8),
+            ('message',    qutf8),
+            ('low_conf',   qbool),
+            ('modifiers',  quint8)),
+
+            #LOG
+            (('time_off', qdatetime),
+            ('dx_call',   qutf8),
+            ('dx_grid',   qutf8),
+            ('tx_freq',   quint64),
+            ('mode',      qutf8),
+            ('rst_sent',  qutf8),
+            ('rst_recv',  qutf8),
+            ('tx_power',  qutf8),
+            ('comments',  qutf8),
+            ('name',      qutf8),
+            ('time_on',   qdatetime),
+            ('op_call',   qutf8),
+            ('my_call',   qutf8),
+            ('my_grid',   qutf8),
+            ('ex_sent',   qutf8),
+            ('ex_recv',   qutf8),
+            ('adif_md',   qutf8)),
+
+            #CLOSE
+            (),
+
+            #REPLAY
+            (),
+
+            #HALT_TX
+            (('auto_tx_only', qbool),),
+
+            #FREE_TEXT
+            (('text', qutf8),
+            ('send',  qbool)),
+
+            #WSPR
+            (('new_',      qbool),
+            ('time',       quint32),
+            ('snr',        qint32),
+            ('delta_time', qdouble),
+            ('freq',       quint64),
+            ('drift',      quint32),
+            ('callsign',   qutf8),
+            ('grid',       qutf8),
+            ('power',      qint32),
+            ('off_air',    qbool)),
+
+            #LOCATION -- note AutoGrid must be checked in WSJT-X
+            (('location', qutf8),),
+
+            #ADIF
+            (('text', qutf8),),
+
+            #HIGHLIGHT CALLSIGN
+            (('call',     qutf8),
+            ('bg',        qcolor),
+            ('fg',        qcolor),
+            ('last_only', qbool)),
+
+            #SWITCH CONFIGURATION
+            (('conf_name', qutf8),),
+
+            #CONFIGURE
+            (('mode',     qutf8),
+            ('freq_tol',  quint32),
+            ('submode',   qutf8),
+            ('fastmode',  qbool),
+            ('tr_period', quint32),
+            ('rx_df',     quint32),
+            ('dx_call',   qutf8),
+            ('dx_grid',   qutf8),
+            ('gen_msg',   qbool)),
+        )
+
+        def do_fields(a, fields):
+            for n,t in fields:
+                a.__dict__[n] = t(a)
+
+        class Data:
+            pass
+
+        a = Data()
+        a._index = 0
+        a.raw = d
+        do_fields(a, HEADER_FIELDS)
+        do_fields(a, decode_fields[a.msg_id])
+        del a._index
+        return a
+
+    now = datetime.now(timezone.utc)
+    SAMPLE_DATA = {
+        'HEARTBEAT': t.heartbeat(),
+        'STATUS': build(1,
+            (t.quint64, 14_074_000), (t.qutf8, 'FT8'), (t.qutf8, 'K1ABC'),
+            (t.qutf8, '-12'), (t.qutf8, 'FT8'), (t.qbool, False),
+            (t.qbool, False), (t.qbool, True), (t.quint32, 1500),
+            (t.quint32, 1500), (t.qutf8, 'W1AW'), (t.qutf8, 'FN31'),
+            (t.qutf8, 'FN42'), (t.qbool, False), (t.qutf8, ''),
+            (t.qbool, False), (t.quint8, 0), (t.quint32, 0),
+            (t.quint32, 15), (t.qutf8, 'Default'),
+            (t.qutf8, 'K1ABC W1AW FN31')),
+        'DECODE': build(2,
+            (t.qbool, True), (t.quint32, 45_015_000), (t.qint32, -12),
+            (t.qdouble, 0.2), (t.quint32, 1234), (t.qutf8, '~'),
+            (t.qutf8, 'CQ POTA K1ABC FN42'), (t.qbool, False),
+            (t.qbool, False)),
+        'LOG': build(5,
+            (t.qdatetime, now), (t.qutf8, 'K1ABC'), (t.qutf8, 'FN42'),
+            (t.quint64, 14_074_000), (t.qutf8, 'FT8'), (t.qutf8, '-10'),
+            (t.qutf8, '-12'), (t.qutf8, '5'), (t.qutf8, ''), (t.qutf8, ''),
+            (t.qdatetime, now), (t.qutf8, 'W1AW'), (t.qutf8, 'W1AW'),
+            (t.qutf8, 'FN31'), (t.qutf8, ''), (t.qutf8, ''), (t.qutf8, '')),
+    }
+
+    N = 20_000
+    print(f'{"":10} {"before":>12} {"parse":>12} {"header only":>12}'
+          ' packets/sec')
+    for name, data in SAMPLE_DATA.items():
+        b = timeit(lambda: before(data), number=N)
+        s = timeit(lambda: parse(data), number=N)
+        p = timeit(lambda: peek(data), number=N)
+        print(f'{name:10} {N / b:12,.0f} {N / s:12,.0f} {N / p:12,.0f}')
+
+    burst = [SAMPLE_DATA['DECODE']] * 500
+    s = timeit(lambda: [parse(i) for i in burst], number=N // 500)
+    p = timeit(lambda: parse_many(burst), number=N // 500)
+    print(f'{"BURST":10} {"":12} {N / s:12,.0f} {N / p:12,.0f} parse_many')
+
+    # memory retained per decode, as kept in model.r for a whole cycle
+    import tracemalloc
+    decode = SAMPLE_DATA['DECODE']
+    for name, fn in (('before', before), ('parse', parse)):
+        tracemalloc.start()
+        m = tracemalloc.get_traced_memory()[0]
+        r = [fn(decode) for _ in range(N)]
+        m = tracemalloc.get_traced_memory()[0] - m
+        tracemalloc.stop()
+        del r
+        print(f'DECODE {name:6} {m / N:9,.0f} bytes retained')
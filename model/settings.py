@@ -1,39 +1,149 @@
+import os
 from os import path
+from threading import Lock, Timer
 from configparser import ConfigParser
 
+def choice(*values):
+    """ type for a str option that must be one of values """
+    def check(value):
+        if (value := str(value).strip().lower()) not in values:
+            raise ValueError(f'{value!r} is not one of {", ".join(values)}')
+        return value
+    return check
+
+# ingest.Overflow names
+OVERFLOW = choice('block', 'drop_oldest', 'drop_newest')
+
+# attribute: (section, option, type, default), a value the type rejects
+# (ValueError) is replaced by the default
+FIELDS = {
+    'theme': ('default', 'theme', str, 'clam'),
+    'wsjtx_host': ('default', 'wsjtx_host', str, '127.0.0.1'),
+    'wsjtx_port': ('default', 'wsjtx_port', int, 2237),
+    'wsjtx_engine': ('default', 'wsjtx_engine', str, 'thread'),
+    'wsjtx_rcvbuf': ('default', 'wsjtx_rcvbuf', int, 0),
+    'relay': ('default', 'relay', str, ''),
+    'ingest_size': ('default', 'ingest_size', int, 1024),
+    'rank_k': ('default', 'rank_k', int, 50),
+    'history_cycles': ('default', 'history_cycles', int, 240),
+    'sync_records': ('default', 'sync_records', int, 8),
+    'sync_ms': ('default', 'sync_ms', int, 2000),
+    'gps_overflow': ('default', 'gps_overflow', OVERFLOW, 'drop_oldest'),
+    'wsjtx_overflow': ('default', 'wsjtx_overflow', OVERFLOW, 'drop_newest'),
+    'main_x': ('default', 'main_x', int, 20),
+    'main_y': ('default', 'main_y', int, 20),
+    'park': ('default', 'park', str, ''),
+    'shift': ('default', 'shift', str, ''),
+    'capture': ('default', 'capture', str, ''),
+    'gps_host': ('rpi', 'gps_host', str, '127.0.0.1'),
+    'gps_port': ('rpi', 'gps_port', int, 2947),
+    'gps_serial_port': ('win32', 'gps_port', str, 'COM4'),
+}
+
+# seconds after the last change before the file is written
+SAVE_DELAY = 2.0
+
 class Settings:
-    def __init__(self, inin):
+    """
+    typed values are plain attributes (settings.park), read without
+    touching the ConfigParser, changes go through update() which
+    notifies listeners and schedules a save
+    """
+    def __init__(self, inin, delay=SAVE_DELAY):
         self.inin = inin
-        # print(self.inin)
-        if not path.exists(self.inin):
-            self.defaults()
-        else:
-            self.config = ConfigParser()
+        self.delay = delay
+        self._lock = Lock()
+        self._timer = None
+        self._dirty = False
+        self._listeners = {}
+        self.config = ConfigParser()
+        if path.exists(self.inin):
             self.config.read(self.inin)
+        self.defaults()
 
     def defaults(self):
-        self.config = ConfigParser()
-        self.config['default'] = {
-            'theme': 'clam',
-            'wsjtx_host': '127.0.0.1',
-            'wsjtx_port': '2237',
-            'main_x': '20',
-            'main_y': '20',
-            'park': '',
-            'shift': ''
-        }
-        self.config['rpi'] = {
-            'gps_host': '127.0.0.1',
-            'gps_port': '2947'
-        }
-        self.config['win32'] = {
-            'gps_port': 'COM4'
-        }
+        """ load typed values, missing or bad options get the default """
+        for name, (section, option, type_, default) in FIELDS.items():
+            if not self.config.has_section(section):
+                self.config.add_section(section)
+            try:
+                v = type_(self.config[section][option])
+            except (KeyError, ValueError):
+                v = default
+                self.config[section][option] = str(v)
+                # an ini from an older version gets the new keys
+                self._dirty = True
+            setattr(self, name, v)
+
+    def add_listener(self, name, fn):
+        """ fn(name, value) after name changes """
+        try:
+            self._listeners[name].add(fn)
+        except KeyError:
+            self._listeners[name] = set({fn})
+
+    def remove_listener(self, name, fn):
+        try:
+            self._listeners[name].remove(fn)
+        except KeyError:
+            pass
+
+    def update(self, **values):
+        changed = []
+        # every value is checked before any is set
+        values = {name: FIELDS[name][2](value)
+                  for name, value in values.items()}
+        with self._lock:
+            for name, value in values.items():
+                section, option, _, _ = FIELDS[name]
+                if getattr(self, name) != value:
+                    setattr(self, name, value)
+                    self.config[section][option] = str(value)
+                    changed.append((name, value))
+            if changed:
+                self._dirty = True
+                # debounce, a burst of changes is written once
+                if self._timer is not None:
+                    self._timer.cancel()
+                self._timer = Timer(self.delay, self.save)
+                self._timer.daemon = True
+                self._timer.start()
+        for name, value in changed:
+            for fn in tuple(self._listeners.get(name, ())):
+                fn(name, value)
 
     def save(self):
-        with open(self.inin, 'w') as f:
-            self.config.write(f)
-               
-          
+        """ write if changed, a temp file is renamed over the old one """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty and path.exists(self.inin):
+                return
+            t = self.inin + '.tmp'
+            with open(t, 'w') as f:
+                self.config.write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(t, self.inin)
+            self._dirty = False
+
+
 if __name__ == '__main__':
-    settings = Settings()
+    from tempfile import mkdtemp
+    from timeit import timeit
+
+    settings = Settings(path.join(mkdtemp(), 'test.ini'), delay=0.1)
+    park = settings.config['default']
+    n = 1_000_000
+    s = timeit(lambda: park['park'], number=n)
+    print(f'ConfigParser  {n / s:12,.0f} reads/sec')
+    s = timeit(lambda: settings.park, number=n)
+    print(f'Settings      {n / s:12,.0f} reads/sec')
+    changes = []
+    settings.add_listener('park', lambda n, v: changes.append(v))
+    for i in range(100):
+        settings.update(park=f'K-{i:04d}')
+    settings.save()
+    print(f'{len(changes)} changes, saved park',
+          Settings(settings.inin).park)
@@ -1,4 +1,5 @@
-from struct import pack
+from struct import pack, Struct
+from threading import Lock
 from datetime import datetime, timezone
 
 
@@ -59,87 +60,146 @@ def qcolor(d, color=None):
         d.append(pack(FMT, 1, *color, 0))
 
 def qutf8(d, x):
+    x = x.encode()
     qint32(d, len(x))
-    d.append(x.encode())
+    d.append(x)
 
 
-def header(d, msg_id):
-    MAGIC = 0xadbccbda
-    SCHEMA = 2
-    APP_ID = 'WSJT-X'
+MAGIC = 0xadbccbda
+SCHEMA = 2
+APP_ID = 'WSJT-X'
+
+def header(d, msg_id, id_=APP_ID):
     quint32(d, MAGIC)
     quint32(d, SCHEMA)
     quint32(d, msg_id)
-    qutf8(d, APP_ID)
+    qutf8(d, id_)
 
-def heartbeat():
+def encode(msg_id, *fields, id_=APP_ID):
     d = []
-    MAX_SCHEMA = 3
-    VERSION = '1.0.0'
-    REVISION = '00001'
-    header(d, 0)
-    quint32(d, MAX_SCHEMA)
-    qutf8(d, VERSION)
-    qutf8(d, REVISION)
+    header(d, msg_id, id_)
+    for fn, x in fields:
+        fn(d, x)
     return b''.join(d)
 
-def clear(window=0):
-    d = []
-    header(d, 3);
-    quint8(d, window)
-    return b''.join(d)
+# constant messages are encoded once per client id, the id of the
+# WSJT-X instance they are sent to
+
+_constants = {}
+
+def constant(msg_id, *fields, id_=APP_ID):
+    key = (id_, msg_id, fields)
+    try:
+        return _constants[key]
+    except KeyError:
+        r = _constants[key] = encode(msg_id, *fields, id_=id_)
+        return r
+
+# variable messages are packed into one reusable buffer with a
+# precompiled Struct per layout, string lengths are part of the layout
+
+_buf = bytearray(512)
+_lock = Lock()
+_layouts = {}
+
+def _layout(id_, msg_id, fmt, *sizes):
+    """ (header, header size, message size, pack_into) for fmt and sizes """
+    key = (id_, msg_id, fmt, sizes)
+    try:
+        return _layouts[key]
+    except KeyError:
+        s = Struct('>' + fmt.format(*sizes))
+        h = constant(msg_id, id_=id_)
+        if len(h) + s.size > len(_buf):
+            with _lock:
+                _buf.extend(bytes(len(h) + s.size - len(_buf)))
+        r = _layouts[key] = (h, len(h), len(h) + s.size, s.pack_into)
+        return r
+
+def _pack(layout, *values):
+    h, o, e, pack_into = layout
+    with _lock:
+        _buf[:o] = h
+        pack_into(_buf, o, *values)
+        return bytes(_buf[:e])
+
+def heartbeat(id_=APP_ID):
+    return constant(0, (quint32, 3), (qutf8, '1.0.0'), (qutf8, '00001'),
+                    id_=id_)
+
+def clear(window=0, id_=APP_ID):
+    return constant(3, (quint8, window), id_=id_)
 
 def reply(msg, modifiers=0):
-    d = []
-    header(d, 4)
-    quint32(d, msg.time)
-    qint32(d, msg.snr)
-    qdouble(d, msg.delta_time)
-    quint32(d, msg.delta_freq)
-    qutf8(d, msg.mode)
-    qutf8(d, msg.message)
-    qbool(d, msg.low_conf)
-    quint8(d, modifiers)
-    return b''.join(d)
-
-def close():
-    d = []
-    header(d, 6)
-    return b''.join(d)
-
-def replay():
-    d = []
-    header(d, 7)
-    return b''.join(d)
-
-def halt_tx(auto_tx_only=False):
-    d = []
-    header(d, 8)
-    qbool(d, auto_tx_only)
-    return b''.join(d)
-
-def free_text(text, send):
-    d = []
-    header(d, 9)
-    qutf8(d, text)
-    qbool(d, send)
-    return b''.join(d)
-
-def location(location):
-    d = []
-    header(d, 11)
-    qutf8(d, location)
-    return b''.join(d)
-
+    mode = msg.mode.encode()
+    message = msg.message.encode()
+    return _pack(_layout(msg.id_, 4, 'IidII{}sI{}s?B',
+                         len(mode), len(message)),
+                 msg.time,
+                 msg.snr,
+                 msg.delta_time,
+                 msg.delta_freq,
+                 len(mode), mode,
+                 len(message), message,
+                 msg.low_conf,
+                 modifiers)
+
+def close(id_=APP_ID):
+    return constant(6, id_=id_)
+
+def replay(id_=APP_ID):
+    return constant(7, id_=id_)
+
+def halt_tx(auto_tx_only=False, id_=APP_ID):
+    return constant(8, (qbool, bool(auto_tx_only)), id_=id_)
+
+def free_text(text, send, id_=APP_ID):
+    text = text.encode()
+    return _pack(_layout(id_, 9, 'I{}s?', len(text)),
+                 len(text), text,
+                 send)
+
+def location(location, id_=APP_ID):
+    location = location.encode()
+    return _pack(_layout(id_, 11, 'I{}s', len(location)),
+                 len(location), location)
+
+
+NO_COLOR = (0,0,0,0,0,0)
 
 def highlight_call(call,
                    foreground=None,
                    background=(0xffff,0,0,0),
-                   highlight_last=True):
-    d = []
-    header(d,13)
-    qutf8(d, call)
-    qcolor(d, background)
-    qcolor(d, foreground)
-    qbool(d, highlight_last)
-    return b''.join(d)
+                   highlight_last=True,
+                   id_=APP_ID):
+    """
+    color = (A,R,G,B)
+    """
+    call = call.encode()
+    bg = NO_COLOR if background is None else (1, *background, 0)
+    fg = NO_COLOR if foreground is None else (1, *foreground, 0)
+    return _pack(_layout(id_, 13, 'I{}sBHHHHHBHHHHH?', len(call)),
+                 len(call), call,
+                 *bg,
+                 *fg,
+                 highlight_last)
+
+
+if __name__ == '__main__':
+    from timeit import timeit
+    try:
+        from rx_msg import Decode
+    except ModuleNotFoundError:
+        from model.rx_msg import Decode
+
+    msg = Decode(MAGIC, SCHEMA, 2, APP_ID, True, 45_015_000, -12, 0.2,
+                 1234, '~', 'CQ POTA K1ABC FN42', False, False)
+    N = 100_000
+    for name, fn in (('heartbeat', heartbeat),
+                     ('halt_tx', lambda: halt_tx(True)),
+                     ('reply', lambda: reply(msg)),
+                     ('location', lambda: location('FN31pr')),
+                     ('free_text', lambda: free_text('CQ POTA W1AW', True)),
+                     ('highlight', lambda: highlight_call('K1ABC'))):
+        s = timeit(fn, number=N)
+        print(f'{name:10} {N / s:12,.0f} messages/sec')
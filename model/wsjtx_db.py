@@ -1,63 +1,224 @@
 """store/query logged contacts"""
+import re
 import sqlite3
-from os import path
-from datetime import datetime, timezone
+from time import perf_counter
+from enum import Enum
+from threading import Event, local
 
 try:
-    from utility import lon_lat
     from rx_msg import to_datetime
+    from ingest import IngestQueue, Overflow
+    from adif import records, qso_row, AdifLog
+    from adif import write as write_adif
 except ModuleNotFoundError:
-    from model.utility import lon_lat
     from model.rx_msg import to_datetime
+    from model.ingest import IngestQueue, Overflow
+    from model.adif import records, qso_row, AdifLog
+    from model.adif import write as write_adif
+
+PRAGMAS = (
+    'pragma journal_mode=wal',
+    # writes are group committed, so each commit can afford its fsync
+    'pragma synchronous=full',
+    'pragma mmap_size=67108864',
+    'pragma cache_size=-8000',
+    'pragma temp_store=memory',
+)
+
+INSERT_QSO = """insert or replace into qsos(
+        time_off,
+        dx_call,
+        dx_grid,
+        tx_freq,
+        mode,
+        rst_sent,
+        rst_recv,
+        tx_power,
+        comments,
+        name,
+        time_on,
+        op_call,
+        my_call,
+        my_grid,
+        ex_sent,
+        ex_recv,
+        adif_md,
+        ordinal_on,
+        band,
+        park,
+        shift
+) values (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"""
+
+# adif.qso_record() order
+EXPORT_COLUMNS = """time_off, dx_call, dx_grid, tx_freq, mode, rst_sent,
+    rst_recv, tx_power, comments, name, time_on, op_call, my_call, my_grid,
+    ex_sent, ex_recv, adif_md, band, park"""
+
+# imported QSOs never replace logged ones
+INSERT_IMPORT = INSERT_QSO.replace('or replace', 'or ignore', 1)
+IMPORT_BATCH = 5_000
+IMPORT_COMMIT = 50_000
+
+# schema versions, PRAGMA user_version is the number applied
+MIGRATIONS = (
+    # 1: qsos, databases from before versioning already have it all
+    ("""
+        create table if not exists qsos (
+            time_off int,
+            dx_call text,
+            dx_grid text,
+            tx_freq int,
+            mode text,
+            rst_sent text,
+            rst_recv text,
+            tx_power text,
+            comments text,
+            name text,
+            time_on real,
+            op_call text,
+            my_call text,
+            my_grid text,
+            ex_sent text,
+            ex_recv text,
+            adif_md text,
+            ordinal_on int,
+            band int,
+            park text,
+            shift text);
+        """,
+        """
+        create unique index if not exists activator on qsos (
+            dx_call,
+            mode,
+            ordinal_on,
+            band,
+            park,
+            shift);
+        """,
+        """
+        create unique index if not exists hunter on qsos (
+            dx_call,
+            mode,
+            ordinal_on,
+            band);
+        """,
+        """
+        create index if not exists activation on qsos (
+            park,
+            shift,
+            ordinal_on);
+        """,
+    ),
+    # 2: covering indexes for the worked_before() scopes, ACTIVATION
+    # is covered by activator, EVER by any index led by dx_call
+    ("""
+        create index if not exists call_band on qsos (dx_call, band);
+        """,
+        """
+        create index if not exists call_day on qsos (dx_call, ordinal_on);
+        """,
+        """
+        create index if not exists call_park on qsos (dx_call, park);
+        """,
+    ),
+)
+
+def migrate(con):
+    """ apply the migrations after user_version, each one committed """
+    version = con.execute('pragma user_version').fetchone()[0]
+    for version, steps in enumerate(MIGRATIONS[version:], version + 1):
+        for i in steps:
+            con.execute(i)
+        con.execute(f'pragma user_version={version}')
+        con.commit()
+    return version
+
+class Scope(Enum):
+    """ worked_before() scope, the value is the columns it matches """
+    EVER = ('dx_call',)
+    BAND = ('dx_call', 'band')
+    DAY = ('dx_call', 'ordinal_on')
+    PARK = ('dx_call', 'park')
+    ACTIVATION = ('dx_call', 'mode', 'ordinal_on', 'band', 'park', 'shift')
+
+WORKED_QUERY = {
+    scope: 'select exists(select 1 from qsos where %s)' % ' and '.join(
+        f'{i}=?' for i in scope.value)
+    for scope in Scope}
+
+# a LOG waits this long for its ADIF before it is written alone
+PAIR_S = 1.0
+# shortest writer idle poll, sync_ms 0 syncs after every item, not a spin
+IDLE_S = 0.05
+
+ADIF_CALL = re.compile(r'<call:(\d+)>', re.I)
+
+def adif_call(text):
+    """ CALL field of an ADIF record, '' if none """
+    m = ADIF_CALL.search(text)
+    return text[m.end():m.end() + int(m[1])] if m else ''
 
 class WsjtxDb:
+    """
+    one connection for the life of the program, written only by the
+    writer thread, lookups are answered from the in-memory index
+
+    the LOG and ADIF messages of a QSO are paired by call and written in
+    the same group, a group is committed (sqlite and .adi fsync) after
+    sync_records QSOs or sync_ms after its first one
+    """
     def __init__(self, model):
         self.model = model
-        CREATE_TABLES = ("""
-            create table if not exists qsos (
-                time_off int,
-                dx_call text,
-                dx_grid text,
-                tx_freq int,
-                mode text,
-                rst_sent text,
-                rst_recv text,
-                tx_power text,
-                comments text,
-                name text,
-                time_on real,
-                op_call text,
-                my_call text,
-                my_grid text,
-                ex_sent text,
-                ex_recv text,
-                adif_md text,
-                ordinal_on int,
-                band int,
-                park text,
-                shift text);
-            """,
-            """
-            create unique index if not exists activator on qsos (
-                dx_call,
-                mode,
-                ordinal_on,
-                band,
-                park,
-                shift);
-            """,
-            """
-            create unique index if not exists hunter on qsos (
-                dx_call,
-                mode,
-                ordinal_on,
-                band);
-            """,
-        )
-        with sqlite3.connect(self.model.dbn) as con:
-            for i in CREATE_TABLES:
-                con.execute(i)
-            con.commit()
+        self.con = con = sqlite3.connect(self.model.dbn,
+                                         check_same_thread=False)
+        for i in PRAGMAS:
+            con.execute(i)
+        migrate(con)
+        self.load_worked(con)
+        # read connection per thread, WAL lets them run beside the writer
+        self.readers = local()
+        s = self.model.settings
+        self.sync_records = s.sync_records
+        self.sync_s = s.sync_ms / 1000
+        self.adif = AdifLog(self.model.adifn)
+        # dx_call -> (time queued, insert params) of a LOG without its ADIF
+        self.pending = {}
+        self.unsynced = 0
+        self.group_start = 0.0
+        self.writer = IngestQueue('db', self.execute, 0, Overflow.BLOCK,
+                                  idle=self.idle,
+                                  timeout=max(IDLE_S,
+                                              min(PAIR_S, self.sync_s)))
+        # the .adi dedup keys are read on the writer, not at startup
+        self.writer.start()
+        self.writer.put(('call', self.adif.load))
+
+    def load_worked(self, con, merge=False):
+        """
+        worked-before index: (dx_call, mode, ordinal_on, band) -> (park, shift)
+        one entry per row, the unique hunter index allows no more
+
+        merge: add the rows to the current index in place, entries already
+        there are newer (a QSO logged since, maybe still pending or queued
+        on the writer) and are kept
+        """
+        if merge:
+            worked, calls, grids = self.worked, self.calls, self.grids
+        else:
+            worked, calls, grids = {}, set(), set()
+        for dx_call, mode, ordinal_on, band, park, shift in con.execute(
+                """select dx_call, mode, ordinal_on, band, park, shift
+                    from qsos"""):
+            worked.setdefault((dx_call, mode, ordinal_on, band), (park, shift))
+        # worked ever, for ranking
+        for dx_call, dx_grid in con.execute(
+                'select dx_call, dx_grid from qsos'):
+            calls.add(dx_call)
+            if dx_grid:
+                grids.add(dx_grid[:4])
+        if not merge:
+            # replaced whole, readers on other threads see old or new
+            self.worked, self.calls, self.grids = worked, calls, grids
 
     mode_lu = {'`': 'FST4',
                '+': 'FT4',
@@ -69,83 +230,346 @@ class WsjtxDb:
                '&': 'MSK144'}
                 
     def exists(self, dx_call, d):
-        QUERY = """select exists(
-            select 1 from qsos
-                where dx_call=?
-                and mode=?
-                and ordinal_on=?
-                and band=?
-                and park=?
-                and shift=?
-            )"""
-        with sqlite3.connect(self.model.dbn) as con:
-            r = con.execute(QUERY, (
-                dx_call,
-                self.mode_lu.get(d.mode, ''),
-                self.model.ordinal,
-                self.model.band,
-                self.model.park,
-                self.model.shift,
-            )).fetchone()
+        i = self.model.instance(d.id_)
+        r = self.worked.get((dx_call,
+                             self.mode_lu.get(d.mode, ''),
+                             i.ordinal,
+                             i.band))
+        s = self.model.settings
+        return int(r == (s.park, s.shift))
+
+    def reader(self):
+        try:
+            return self.readers.con
+        except AttributeError:
+            con = self.readers.con = sqlite3.connect(
+                f'file:{self.model.dbn}?mode=ro', uri=True)
+            return con
+
+    def worked_before(self, scope, dx_call, band=None, mode=None,
+                      ordinal_on=None, park=None, shift=None):
+        """
+        dx_call worked within scope (Scope), the columns of the scope
+        are required, answered from the committed QSOs, up to sync_ms
+        behind; exists() has the current activation from memory
+        """
+        keys = {'dx_call': dx_call, 'band': band, 'mode': mode,
+                'ordinal_on': ordinal_on, 'park': park, 'shift': shift}
+        params = tuple(keys[i] for i in scope.value)
+        if None in params:
+            raise ValueError(f'{scope.name} needs {", ".join(scope.value)}')
+        return bool(self.reader().execute(
+            WORKED_QUERY[scope], params).fetchone()[0])
+
+    def execute(self, item):
+        """ writer thread: add one item to the current group """
+        match item:
+            case ('log', dx_call, params):
+                self.pending[dx_call] = (perf_counter(), params)
+            case ('call', fn):
+                self.sync()
+                fn()
+            case ('adif', text):
+                p = self.pending.pop(adif_call(text), None)
+                if p is not None:
+                    self.con.execute(INSERT_QSO, p[1])
+                # a re-sent QSO is already in the .adi file
+                if self.adif.append(text) or p is not None:
+                    self.grouped()
+        self.idle()
+
+    def grouped(self):
+        if self.unsynced == 0:
+            self.group_start = perf_counter()
+        self.unsynced += 1
+
+    def idle(self):
+        """ writer thread: write unpaired LOGs, sync a full or old group """
+        now = perf_counter()
+        for dx_call, (t, params) in tuple(self.pending.items()):
+            if now - t > PAIR_S:
+                del self.pending[dx_call]
+                self.con.execute(INSERT_QSO, params)
+                self.grouped()
+        # a QSO waiting for its ADIF holds the group open
+        if (self.unsynced and not self.pending
+            and (self.unsynced >= self.sync_records
+                 or now - self.group_start >= self.sync_s)):
+            self.sync()
+
+    def sync(self):
+        self.con.commit()
+        self.adif.flush()
+        self.unsynced = 0
+
+    def call(self, fn, *args):
+        """ run fn(*args) on the writer thread, wait for the result """
+        done = Event()
+        r = [None, None]
+        def job():
+            try:
+                r[0] = fn(*args)
+            except Exception as e:
+                r[1] = e
+            finally:
+                done.set()
+        self.writer.start()
+        self.writer.put(('call', job))
+        done.wait()
+        if r[1] is not None:
+            raise r[1]
         return r[0]
 
+    def import_adif(self, filename, park='', shift=''):
+        """
+        stream an ADIF file into qsos, QSOs already there are kept,
+        returns (imported, skipped)
+        """
+        return self.call(self.load_adif, filename, park, shift)
+
+    def load_adif(self, filename, park, shift):
+        """ writer thread: batched inserts, a commit every IMPORT_COMMIT """
+        con = self.con
+        changes = con.total_changes
+        n = bad = since = 0
+        batch = []
+        with open(filename, encoding='utf-8', errors='replace') as f:
+            for r in records(f):
+                try:
+                    row = qso_row(r, park, shift)
+                except ValueError:
+                    row = None
+                if row is None:
+                    bad += 1
+                    continue
+                batch.append(row)
+                if len(batch) >= IMPORT_BATCH:
+                    con.executemany(INSERT_IMPORT, batch)
+                    n += len(batch)
+                    since += len(batch)
+                    batch.clear()
+                    if since >= IMPORT_COMMIT:
+                        con.commit()
+                        since = 0
+        con.executemany(INSERT_IMPORT, batch)
+        n += len(batch)
+        con.commit()
+        imported = con.total_changes - changes
+        self.load_worked(con, merge=True)
+        return imported, bad + n - imported
+
+    def export_query(self, park=None, shift=None, day=None, band=None,
+                     mode=None):
+        """ select for the QSOs matching the filters that are not None """
+        where = []
+        params = []
+        for column, value in (('park', park),
+                              ('shift', shift),
+                              ('ordinal_on', None if day is None
+                               else day.toordinal()),
+                              ('band', band),
+                              ('mode', mode)):
+            if value is not None:
+                where.append(f'{column}=?')
+                params.append(value)
+        sql = f'select {EXPORT_COLUMNS} from qsos'
+        if where:
+            sql += ' where ' + ' and '.join(where)
+        return sql + ' order by time_on', params
+
+    def export_adif(self, filename, **filters):
+        """
+        write the QSOs matching filters (export_query) to an ADIF file,
+        streamed from a read-only connection, returns the count
+        """
+        sql, params = self.export_query(**filters)
+        # commit the current group first
+        self.call(self.sync)
+        con = sqlite3.connect(f'file:{self.model.dbn}?mode=ro', uri=True)
+        try:
+            with open(filename, 'w', encoding='utf-8') as f:
+                return write_adif(f, con.execute(sql, params))
+        finally:
+            con.close()
+
     def add(self, d):
-        QUERY = """insert or replace into qsos(
-                time_off,
-                dx_call,
-                dx_grid,
-                tx_freq,
-                mode,
-                rst_sent,
-                rst_recv,
-                tx_power,
-                comments,
-                name,
-                time_on,
-                op_call,
-                my_call,
-                my_grid,
-                ex_sent,
-                ex_recv,
-                adif_md,
-                ordinal_on,
-                band,
-                park,
-                shift
-        ) values (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"""
-
-        with sqlite3.connect(self.model.dbn) as con:
-            con.execute(QUERY, (
-                to_datetime(*d.time_off).timestamp(),
-                d.dx_call,
-                d.dx_grid,
-                d.tx_freq,
-                d.mode,
-                d.rst_sent,
-                d.rst_recv,
-                d.tx_power,
-                d.comments,
-                d.name,
-                to_datetime(*d.time_on).timestamp(),
-                d.op_call,
-                d.my_call,
-                d.my_grid,
-                d.ex_sent,
-                d.ex_recv,
-                d.adif_md,
-                self.model.ordinal,
-                self.model.band,
-                self.model.park,
-                self.model.shift,
-            ))
-            con.commit()
+        i = self.model.instance(d.id_)
+        self.writer.start()
+        self.writer.put(('log', d.dx_call, (
+            to_datetime(*d.time_off).timestamp(),
+            d.dx_call,
+            d.dx_grid,
+            d.tx_freq,
+            d.mode,
+            d.rst_sent,
+            d.rst_recv,
+            d.tx_power,
+            d.comments,
+            d.name,
+            to_datetime(*d.time_on).timestamp(),
+            d.op_call,
+            d.my_call,
+            d.my_grid,
+            d.ex_sent,
+            d.ex_recv,
+            d.adif_md,
+            i.ordinal,
+            i.band,
+            self.model.park,
+            self.model.shift,
+        )))
+        # 'insert or replace' keeps one row per hunter key, so does the index
+        self.worked[(d.dx_call, d.mode, i.ordinal, i.band)] = (
+            self.model.park, self.model.shift)
+        self.calls.add(d.dx_call)
+        if d.dx_grid:
+            self.grids.add(d.dx_grid[:4])
 
     def add_log(self, text):
-        exists = path.isfile(self.model.adifn)
-        with open(self.model.adifn, 'a') as f:
-            if exists:
-                text = text.split('<EOH>\n')[1]
-            f.write(text)
+        self.writer.start()
+        self.writer.put(('adif', text))
 
     def close(self):
-        pass
+        # the writer drains its queue before it stops
+        self.writer.stop()
+        for _, params in self.pending.values():
+            self.con.execute(INSERT_QSO, params)
+        self.pending.clear()
+        self.sync()
+        self.con.close()
+        self.adif.close()
+        try:
+            self.readers.con.close()
+        except AttributeError:
+            pass
+
+
+if __name__ == '__main__':
+    # benchmark: inserts and lookups against a database with 100k QSOs,
+    # connection per call (as before) vs the persistent WAL connection
+    import os
+    from random import Random
+    from tempfile import TemporaryDirectory
+    from time import perf_counter
+    from timeit import timeit
+    from types import SimpleNamespace
+
+    N = 100_000
+    with TemporaryDirectory() as td:
+        inst = SimpleNamespace(ordinal=739_000, band=14)
+        settings = SimpleNamespace(park='K-0001', shift='',
+                                   sync_records=8, sync_ms=2000)
+        model = SimpleNamespace(dbn=os.path.join(td, 'bench.sqlite'),
+                                adifn=os.path.join(td, 'bench.adi'),
+                                park='K-0001', shift='',
+                                settings=settings,
+                                instance=lambda id_: inst)
+        rnd = Random(1)
+        calls = [f'K{i}XYZ' for i in range(N // 4)]
+        with sqlite3.connect(model.dbn) as con:
+            con.execute("""create table qsos (time_off int, dx_call text,
+                dx_grid text, tx_freq int, mode text, rst_sent text,
+                rst_recv text, tx_power text, comments text, name text,
+                time_on real, op_call text, my_call text, my_grid text,
+                ex_sent text, ex_recv text, adif_md text, ordinal_on int,
+                band int, park text, shift text)""")
+            con.execute("""create unique index hunter on qsos (
+                dx_call, mode, ordinal_on, band)""")
+            con.executemany(
+                """insert or ignore into qsos(dx_call, mode, ordinal_on,
+                    band, park, shift) values (?,?,?,?,?,?)""",
+                ((rnd.choice(calls), rnd.choice(('FT8', 'FT4')),
+                  739_000 - rnd.randrange(365), rnd.choice((7, 14, 21)),
+                  'K-0001', '') for _ in range(N)))
+            con.commit()
+            rows = con.execute('select count(*) from qsos').fetchone()[0]
+        con.close()
+
+        def params(n):
+            return (0, f'W{n}NEW', 'FN42', 14_074_000, 'FT8', '-10', '-12',
+                    '', '', '', 0, '', 'K1ABC', 'EN80', '', '', '',
+                    739_001, 14, 'K-0001', '')
+
+        def adif(n):
+            return (f'ADIF Export\n<EOH>\n<call:{len(str(n)) + 4}>W{n}NEW'
+                    ' <gridsquare:4>FN42 <mode:3>FT8 <eor>\n')
+
+        # before: a connection and a rollback journal commit per QSO,
+        # the .adi file opened per QSO
+        n = 200
+        t = perf_counter()
+        for j in range(n):
+            with sqlite3.connect(model.dbn) as con:
+                con.execute(INSERT_QSO, params(j))
+                con.commit()
+            con.close()
+            with open(model.adifn, 'a') as f:
+                f.write(adif(j).split('<EOH>\n')[1])
+        print(f'connect  {n / (perf_counter() - t):12,.0f} QSOs/sec')
+
+        s = timeit(lambda: WsjtxDb(model).close(), number=1)
+        print(f'{rows:,} qsos, opened with index in {s * 1000:.0f} ms')
+        # LOG + ADIF pairs, fsync per QSO vs a group of 8
+        for sync_records in (1, 8):
+            settings.sync_records = sync_records
+            db = WsjtxDb(model)
+            n = 2_000
+            t = perf_counter()
+            for j in range(n):
+                k = N * sync_records + j
+                db.writer.start()
+                db.writer.put(('log', f'W{k}NEW', params(k)))
+                db.add_log(adif(k))
+            queued = perf_counter() - t
+            db.close()
+            print(f'group {sync_records} {n / queued:12,.0f} QSOs/sec queued,'
+                  f' {n / (perf_counter() - t):,.0f} QSOs/sec on disk')
+        with open(model.adifn) as f:
+            print(f.read().count('<eor>'), 'ADIF records,',
+                  sqlite3.connect(model.dbn).execute(
+                      "select count(*) from qsos where dx_call like 'W%'"
+                  ).fetchone()[0], 'QSOs')
+        db = WsjtxDb(model)
+
+        QUERY = """select exists(
+            select 1 from qsos
+                where dx_call=? and mode=? and ordinal_on=?
+                and band=? and park=? and shift=?)"""
+
+        def exists_connect(dx_call, d):
+            with sqlite3.connect(model.dbn) as con:
+                r = con.execute(QUERY, (
+                    dx_call, db.mode_lu.get(d.mode, ''), inst.ordinal,
+                    inst.band, model.park, model.shift)).fetchone()[0]
+            con.close()
+            return r
+
+        def exists_persistent(dx_call, d):
+            return db.con.execute(QUERY, (
+                dx_call, db.mode_lu.get(d.mode, ''), inst.ordinal,
+                inst.band, model.park, model.shift)).fetchone()[0]
+
+        d = SimpleNamespace(id_='WSJT-X', mode='~')
+        look = [rnd.choice(calls) for _ in range(1000)]
+        assert ([db.exists(c, d) for c in look]
+                == [exists_connect(c, d) for c in look]
+                == [exists_persistent(c, d) for c in look])
+        for name, fn, n in (('connect', exists_connect, 2_000),
+                            ('cached', exists_persistent, 50_000),
+                            ('index', db.exists, 200_000)):
+            s = timeit(lambda: [fn(c, d) for c in look], number=n // 1000)
+            print(f'{name:8} {n / s:12,.0f} lookups/sec')
+
+        db.sync()
+        keys = {'band': 14, 'mode': 'FT8', 'ordinal_on': inst.ordinal,
+                'park': 'K-0001', 'shift': ''}
+        for scope in Scope:
+            plan = db.reader().execute(
+                'explain query plan ' + WORKED_QUERY[scope],
+                (None,) * len(scope.value)).fetchall()[-1][-1]
+            s = timeit(lambda: [db.worked_before(scope, c, **keys)
+                                for c in look], number=20)
+            hits = sum(db.worked_before(scope, c, **keys) for c in look)
+            print(f'{scope.name:10} {20_000 / s:10,.0f} lookups/sec,'
+                  f' {hits / 10:3.0f}% worked, {plan}')
+        db.close()
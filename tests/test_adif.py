@@ -0,0 +1,165 @@
+from io import StringIO
+
+import pytest
+
+from model.adif import (records, AdifLog, HEADER, band_name, qso_row,
+                        qso_record)
+
+TEXT = ('ADIF Export <call:4>NONE\n'
+        '<adif_ver:5>3.1.4\n<programid:6>WSJT-X\n<EOH>\n'
+        '<call:5>K1ABC <gridsquare:4>FN42 <mode:3>FT8 <qso_date:8>20240322 '
+        '<time_on:6>124335 <comment:12>a <b> c:d e <eor>\n'
+        '<CALL:6:S>W9XYZ/ <MODE:4>MFSK<SUBMODE:3>FT4 <QSO_DATE:8>20240322\n'
+        '<TIME_ON:4>1250 <NAME:0> <EOR>\n')
+
+EXPECTED = [
+    {'call': 'K1ABC', 'gridsquare': 'FN42', 'mode': 'FT8',
+     'qso_date': '20240322', 'time_on': '124335', 'comment': 'a <b> c:d e '},
+    {'call': 'W9XYZ/', 'mode': 'MFSK', 'submode': 'FT4',
+     'qso_date': '20240322', 'time_on': '1250', 'name': ''},
+]
+
+
+def test_records():
+    assert list(records(StringIO(TEXT))) == EXPECTED
+
+
+@pytest.mark.parametrize('chunk', range(1, 40))
+def test_chunk_boundaries(chunk):
+    # every tag and value split across reads somewhere
+    assert list(records(StringIO(TEXT), chunk)) == EXPECTED
+
+
+def test_no_header():
+    text = TEXT[TEXT.index('<EOH>') + 5:]
+    assert list(records(StringIO(text), 7)) == EXPECTED
+
+
+def test_truncated():
+    # the unfinished last record is not returned
+    text = TEXT[:-20]
+    assert list(records(StringIO(text), 5)) == EXPECTED[:1]
+
+
+def test_empty():
+    assert list(records(StringIO(''))) == []
+
+
+def wsjtx_adif(call, time_on='124335', band='20m', mode='FT8'):
+    """ text of a WSJT-X ADIF message """
+    return ('\n<adif_ver:5>3.1.0\n<programid:6>WSJT-X\n<EOH>\n'
+            f'<call:{len(call)}>{call} <mode:{len(mode)}>{mode} '
+            f'<qso_date:8>20240322 <time_on:{len(time_on)}>{time_on} '
+            f'<band:{len(band)}>{band} <eor>\n')
+
+
+def read(filename):
+    with open(filename, encoding='utf-8') as f:
+        return f.read()
+
+
+def test_log_header(tmp_path):
+    fn = tmp_path / 'log.adi'
+    log = AdifLog(fn)
+    assert log.append(wsjtx_adif('K1ABC')) == 1
+    log.close()
+    text = read(fn)
+    # a file starting with '<' has no header
+    assert text[0] != '<'
+    assert text.count('<EOH>') == 1
+    assert [r['call'] for r in records(open(fn))] == ['K1ABC']
+
+
+def test_log_header_without_text_line(tmp_path):
+    fn = tmp_path / 'log.adi'
+    log = AdifLog(fn)
+    log.append('<adif_ver:5>3.1.0 <EOH>' + wsjtx_adif('K1ABC').split(
+        '<EOH>')[1])
+    log.close()
+    assert read(fn).startswith('ADIF Export\n<adif_ver:5>3.1.0 <EOH>\n')
+
+
+def test_log_no_header(tmp_path):
+    fn = tmp_path / 'log.adi'
+    log = AdifLog(fn)
+    log.append(wsjtx_adif('K1ABC').split('<EOH>')[1])
+    log.close()
+    assert read(fn).startswith(HEADER)
+
+
+def test_log_duplicates(tmp_path):
+    fn = tmp_path / 'log.adi'
+    log = AdifLog(fn)
+    assert log.append(wsjtx_adif('K1ABC')) == 1
+    assert log.append(wsjtx_adif('K1ABC')) == 0
+    # HHMM and HHMMSS of the same minute, call case
+    assert log.append(wsjtx_adif('k1abc', '1243', 'bad')) == 1
+    assert log.append(wsjtx_adif('K1ABC', '124300', 'BAD')) == 0
+    assert log.append(wsjtx_adif('K1ABC', band='40m')) == 1
+    assert log.append(wsjtx_adif('K1ABC', mode='FT4')) == 1
+    assert (log.written, log.duplicates) == (4, 2)
+    log.close()
+    log = AdifLog(fn)
+    assert log.append(wsjtx_adif('K1ABC')) == 0
+    assert log.append(wsjtx_adif('W9XYZ')) == 1
+    log.close()
+    text = read(fn)
+    assert text.count('<EOH>') == 1
+    assert len(list(records(open(fn)))) == 5
+
+
+def test_log_submode(tmp_path):
+    log = AdifLog(tmp_path / 'log.adi')
+    assert log.append(wsjtx_adif('K1ABC', mode='FT4')) == 1
+    text = wsjtx_adif('K1ABC', mode='MFSK').replace(
+        '<eor>', '<submode:3>FT4 <eor>')
+    assert log.append(text) == 0
+    log.close()
+
+
+@pytest.mark.parametrize('hz, mhz, band', [
+    (14_074_000, 14, '20m'),
+    (29_074_000, 29, '10m'),
+    (28_074_000, 28, '10m'),
+    (145_500_000, 145, '2m'),
+    (147_000_000, 147, '2m'),
+    (223_500_000, 223, '1.25m'),
+    (446_000_000, 446, '70cm'),
+    (5_357_000, 5, '60m'),
+    (475_700, 0, '630m'),
+    # band column only (an import without FREQ)
+    (0, 29, '10m'),
+    (0, 1, '160m'),
+    (0, 146, '2m'),
+    (0, 0, ''),
+    (0, 99, ''),
+])
+def test_band_name(hz, mhz, band):
+    assert band_name(hz, mhz) == band
+
+
+def test_export_round_trip():
+    r = {'call': 'K1ABC', 'qso_date': '20240322', 'time_on': '124300',
+         'freq': '29.074000', 'mode': 'FT8', 'my_sig': 'POTA',
+         'my_sig_info': 'K-0001'}
+    row = qso_row(r)
+    # INSERT_QSO order to EXPORT_COLUMNS order: no ordinal_on and shift
+    out = next(records(StringIO(qso_record(row[:17] + row[18:20]))))
+    assert out['band'] == '10m'
+    assert out['freq'] == '29.074000'
+    assert (out['call'], out['qso_date'], out['time_on']) == (
+        'K1ABC', '20240322', '124300')
+    assert out['my_sig_info'] == 'K-0001'
+
+
+def test_log_keys_read_on_first_use(tmp_path):
+    fn = tmp_path / 'log.adi'
+    log = AdifLog(fn)
+    log.append(wsjtx_adif('K1ABC'))
+    log.close()
+    # opening does not read the file, the first append does
+    log = AdifLog(fn)
+    assert log.keys is None
+    assert log.append(wsjtx_adif('K1ABC')) == 0
+    assert len(log.keys) == 1
+    log.close()
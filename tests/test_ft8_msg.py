@@ -0,0 +1,76 @@
+import pytest
+
+from model.ft8_msg import classify, parse, Kind, Parsed, FREE
+
+
+@pytest.mark.parametrize('message, expected', [
+    ('CQ K1ABC FN42', Parsed(Kind.CQ, 'K1ABC', '', '', 'FN42', '')),
+    ('CQ K1ABC', Parsed(Kind.CQ, 'K1ABC', '', '', '', '')),
+    ('QRZ K1ABC FN42', Parsed(Kind.CQ, 'K1ABC', '', '', 'FN42', '')),
+    ('CQ DX K1ABC FN42', Parsed(Kind.CQ, 'K1ABC', '', 'DX', 'FN42', '')),
+    ('CQ POTA W9XYZ EN52', Parsed(Kind.CQ, 'W9XYZ', '', 'POTA', 'EN52', '')),
+    ('CQ 290 K1ABC FN42', Parsed(Kind.CQ, 'K1ABC', '', '290', 'FN42', '')),
+    ('CQ EA8/DL1ZZ IL18', Parsed(Kind.CQ, 'EA8/DL1ZZ', '', '', 'IL18', '')),
+    ('CQ W1AB/P FN42', Parsed(Kind.CQ, 'W1AB/P', '', '', 'FN42', '')),
+    ('CQ <K1ABC> FN42', Parsed(Kind.CQ, 'K1ABC', '', '', 'FN42', '')),
+])
+def test_cq(message, expected):
+    assert classify(message) == expected
+
+
+@pytest.mark.parametrize('message, expected', [
+    ('K1ABC W9XYZ EN52', Parsed(Kind.QSO, 'W9XYZ', 'K1ABC', '', 'EN52', '')),
+    ('K1ABC W9XYZ -12', Parsed(Kind.QSO, 'W9XYZ', 'K1ABC', '', '', '-12')),
+    ('K1ABC W9XYZ R-05', Parsed(Kind.QSO, 'W9XYZ', 'K1ABC', '', '', 'R-05')),
+    ('K1ABC W9XYZ RR73', Parsed(Kind.QSO, 'W9XYZ', 'K1ABC', '', '', 'RR73')),
+    ('K1ABC W9XYZ R EN52', Parsed(Kind.QSO, 'W9XYZ', 'K1ABC', '', 'EN52', 'R')),
+    ('<K1ABC> W9XYZ -12', Parsed(Kind.QSO, 'W9XYZ', 'K1ABC', '', '', '-12')),
+    ('K1ABC <...> -12', Parsed(Kind.QSO, '...', 'K1ABC', '', '', '-12')),
+])
+def test_qso(message, expected):
+    assert classify(message) == expected
+
+
+@pytest.mark.parametrize('message', [
+    'TNX 73 GL', 'CQ', '', 'HELLO', 'CQ DX', 'K1ABC', 'CQ DX FN42',
+    'A; B C D',
+])
+def test_free_text(message):
+    assert classify(message) == FREE
+
+
+def test_to_me():
+    p = classify('K1ABC W9XYZ -12', 'K1ABC')
+    assert p.kind is Kind.TO_ME
+    assert p.dx_call == 'W9XYZ'
+    assert p.report == '-12'
+    assert classify('K1ABC W9XYZ -12', 'N0CALL').kind is Kind.QSO
+
+
+def test_to_me_hashed():
+    assert classify('<K1ABC> W9XYZ -12', 'K1ABC').kind is Kind.TO_ME
+
+
+def test_cq_is_never_to_me():
+    assert classify('CQ K1ABC FN42', 'K1ABC').kind is Kind.CQ
+
+
+def test_no_de_call():
+    # before the first STATUS de_call is '', nothing is TO_ME
+    assert classify('K1ABC W9XYZ -12', '').kind is Kind.QSO
+
+
+def test_dxpedition():
+    message = 'K1ABC RR73; W9XYZ <KH1/KH7Z> -12'
+    first, second = parse(message)
+    assert first == Parsed(Kind.QSO, 'KH1/KH7Z', 'K1ABC', '', '', 'RR73')
+    assert second == Parsed(Kind.QSO, 'KH1/KH7Z', 'W9XYZ', '', '', '-12')
+    assert classify(message, 'K1ABC') == first._replace(kind=Kind.TO_ME)
+    assert classify(message, 'W9XYZ') == second._replace(kind=Kind.TO_ME)
+    assert classify(message, 'N0CALL') == first
+
+
+def test_cache_keeps_de_call_separate():
+    # the cache is keyed by text only, TO_ME depends on de_call
+    assert classify('W1AW K1ABC -01', 'W1AW').kind is Kind.TO_ME
+    assert classify('W1AW K1ABC -01', 'K1ABC').kind is Kind.QSO
@@ -0,0 +1,69 @@
+import pytest
+
+from model.gpsd import LineReader, report
+
+TPV = (b'{"class":"TPV","device":"/dev/ttyACM0","mode":3,'
+       b'"time":"2024-03-22T12:43:35.000Z","lat":40.0123,"lon":-83.5,'
+       b'"altHAE":250.1,"speed":0.02}')
+SKY = b'{"class":"SKY","device":"/dev/ttyACM0","satellites":[{"PRN":1}]}'
+VERSION = b'{"class":"VERSION","release":"3.22","proto_major":3}'
+STREAM = VERSION + b'\r\n' + TPV + b'\r\n' + SKY + b'\r\n' + TPV + b'\n'
+
+
+def test_whole_lines():
+    assert LineReader().feed(STREAM) == [VERSION, TPV, SKY, TPV]
+
+
+@pytest.mark.parametrize('size', [1, 2, 7, 64, 100, 1000])
+def test_split_reads(size):
+    r = LineReader()
+    lines = []
+    for i in range(0, len(STREAM), size):
+        lines += r.feed(STREAM[i:i + size])
+    assert lines == [VERSION, TPV, SKY, TPV]
+    assert r.partial == b''
+
+
+def test_partial_waits():
+    r = LineReader()
+    assert r.feed(TPV[:30]) == []
+    assert r.feed(TPV[30:]) == []
+    assert r.feed(b'\n\n') == [TPV]
+
+
+def test_overlong_line_dropped():
+    r = LineReader(maxlen=16)
+    assert r.feed(b'x' * 40) == []
+    assert r.dropped == 1
+    assert r.feed(b'\n' + VERSION + b'\n') == [VERSION]
+
+
+def test_tpv():
+    assert report(TPV) == {'class': 'TPV', 'lat': 40.0123, 'lon': -83.5,
+                           'time': '2024-03-22T12:43:35.000Z'}
+
+
+def test_tpv_no_fix():
+    r = report(b'{"class":"TPV","device":"/dev/ttyACM0","mode":1}')
+    assert r == {'class': 'TPV'}
+
+
+def test_tpv_exponent():
+    r = report(b'{"class":"TPV","lat":4.0e1,"lon":-8.3E+1}')
+    assert (r['lat'], r['lon']) == (40.0, -83.0)
+
+
+def test_skipped():
+    assert report(SKY) is None
+
+
+def test_other_reports_parsed():
+    assert report(VERSION) == {'class': 'VERSION', 'release': '3.22',
+                               'proto_major': 3}
+
+
+@pytest.mark.parametrize('line', [
+    b'', b'garbage', b'{"class":"VERSION",', b'{"device":"x"}',
+])
+def test_bad_lines(line):
+    assert report(line) is None
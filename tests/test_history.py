@@ -0,0 +1,104 @@
+from model.history import History, DAY_MS
+
+FT8 = 15_000
+FT4 = 7_500
+
+
+def test_heard_newest_first():
+    h = History(10)
+    h.add(0, 'K1ABC', -10, 14, 0, 'FN42')
+    h.add(FT8, 'K1ABC', -5, 14, 0)
+    h.add(FT8, 'W9XYZ', 0, 14, 0)
+    assert [i.time for i in h.heard('K1ABC')] == [FT8, 0]
+    assert h.last_heard('K1ABC').snr == -5
+    assert h.last_grid('K1ABC') == 'FN42'
+    assert h.last_heard('N0CALL') is None
+
+
+def test_heard_by_band():
+    h = History(10)
+    h.add(0, 'K1ABC', -10, 14, 0)
+    h.add(FT8, 'K1ABC', -5, 7, 0)
+    assert h.last_heard('K1ABC', 14).time == 0
+    assert h.last_heard('K1ABC', 21) is None
+
+
+def test_eviction_frees_calls():
+    h = History(2)
+    h.add(0, 'K1ABC', 0, 14, 0)
+    h.add(FT8, 'W9XYZ', 0, 14, 0)
+    h.add(2 * FT8, 'W9XYZ', 0, 14, 0)
+    assert h.last_heard('K1ABC') is None
+    assert len(h) == 1
+    assert h.cycle_rows(0) == ()
+    # the freed id is reused
+    h.add(3 * FT8, 'VE3AAA', 0, 14, 0)
+    assert len(h.names) == 2
+
+
+def test_memory_flat():
+    h = History(4)
+    for n in range(100):
+        h.add(n * FT8, f'K{n}ABC', 0, 14, 0)
+    assert len(h) == 4
+    assert len(h.index) == 4
+    assert len(h.names) <= 5
+
+
+def interleaved(h):
+    # FT8 decodes arrive about 13 s into the period, FT4 about 6 s, so
+    # an FT4 cycle is often added before an earlier FT8 one
+    h.add(FT4, 'K1ABC', -1, 14, 0)
+    h.add(2 * FT4, 'K1ABC', -2, 14, 0)
+    h.add(0, 'K1ABC', -3, 7, 0)
+    h.add(3 * FT4, 'K1ABC', -4, 14, 0)
+    h.add(FT8, 'K1ABC', -5, 7, 0)
+
+
+def test_out_of_order_cycles():
+    h = History(10)
+    interleaved(h)
+    # FT8 and 2 * FT4 start together, one cycle
+    assert [i.snr for i in h.heard('K1ABC')] == [-4, -5, -2, -1, -3]
+    assert [c.time for c in h.cycles] == [0, FT4, 2 * FT4, 3 * FT4]
+    assert len(h.cycle_rows(FT8)) == 2
+
+
+def test_out_of_order_eviction():
+    h = History(3)
+    interleaved(h)
+    assert [c.time for c in h.cycles] == [FT4, 2 * FT4, 3 * FT4]
+    assert [i.snr for i in h.heard('K1ABC')] == [-4, -5, -2, -1]
+    # older than every cycle kept, not added
+    h.add(0, 'W9XYZ', 0, 14, 0)
+    assert h.last_heard('W9XYZ') is None
+    for n in range(4, 7):
+        h.add(n * FT4, 'W9XYZ', 0, 14, 0)
+    assert h.last_heard('K1ABC') is None
+    assert len(h) == 1 and len(h.index) == 1
+
+
+def test_same_call_twice_in_a_cycle():
+    h = History(10)
+    h.add(0, 'K1ABC', -1, 14, 0)
+    h.add(FT8, 'K1ABC', -2, 14, 0)
+    h.add(0, 'K1ABC', -3, 7, 0)
+    assert sorted(i.snr for i in h.heard('K1ABC')) == [-3, -2, -1]
+
+
+def test_recent():
+    h = History(100)
+    interleaved(h)
+    h.add(FT8, 'W9XYZ', 0, 14, 1)
+    assert [i.snr for i in h.recent(0, FT4)] == [-4]
+    assert [i.call for i in h.recent(1, 10 * 60_000)] == ['W9XYZ']
+    assert [i.call for i in h.recent(1, 10 * 60_000, band=7)] == []
+
+
+def test_midnight():
+    h = History(10)
+    h.add(DAY_MS - FT8, 'K1ABC', -1, 14, 0)
+    h.add(0, 'K1ABC', -2, 14, 0)
+    h.add(DAY_MS - 2 * FT8, 'K1ABC', -3, 14, 0)
+    assert [i.snr for i in h.heard('K1ABC')] == [-2, -1, -3]
+    assert [i.snr for i in h.recent(0, FT8)] == [-2]
@@ -0,0 +1,59 @@
+from configparser import ConfigParser
+
+import pytest
+
+from model.settings import Settings, FIELDS
+
+
+def read(filename):
+    c = ConfigParser()
+    c.read(filename)
+    return c
+
+
+def test_defaults(tmp_path):
+    s = Settings(str(tmp_path / 'new.ini'))
+    for name, (_, _, _, default) in FIELDS.items():
+        assert getattr(s, name) == default
+
+
+def test_old_ini_gets_new_keys(tmp_path):
+    fn = tmp_path / 'old.ini'
+    fn.write_text('[default]\ntheme = clam\npark = K-0001\n')
+    s = Settings(str(fn))
+    assert s.park == 'K-0001'
+    s.save()
+    c = read(fn)
+    assert c['default']['relay'] == ''
+    assert c['default']['park'] == 'K-0001'
+
+
+def test_bad_value_is_default(tmp_path):
+    fn = tmp_path / 'bad.ini'
+    fn.write_text('[default]\nwsjtx_port = x\n')
+    assert Settings(str(fn)).wsjtx_port == 2237
+
+
+def test_update(tmp_path):
+    fn = str(tmp_path / 'test.ini')
+    s = Settings(fn, delay=60)
+    changes = []
+    s.add_listener('park', lambda n, v: changes.append((n, v)))
+    s.update(park='K-0001', main_x='40')
+    s.update(park='K-0001')
+    assert changes == [('park', 'K-0001')]
+    assert s.main_x == 40
+    s.save()
+    assert Settings(fn).park == 'K-0001'
+
+
+def test_overflow_checked(tmp_path):
+    fn = tmp_path / 'overflow.ini'
+    fn.write_text('[default]\ngps_overflow = drop-oldest\n'
+                  'wsjtx_overflow = BLOCK\n')
+    s = Settings(str(fn))
+    assert s.gps_overflow == 'drop_oldest'
+    assert s.wsjtx_overflow == 'block'
+    with pytest.raises(ValueError):
+        s.update(gps_overflow='newest')
+    assert s.gps_overflow == 'drop_oldest'
@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+
+import pytest
+
+from model.wsjtx_db import WsjtxDb
+
+ORDINAL = 739_000
+JDAY = ORDINAL + 1721425
+
+
+@pytest.fixture
+def db(tmp_path):
+    inst = SimpleNamespace(ordinal=ORDINAL, band=14)
+    settings = SimpleNamespace(park='K-0001', shift='',
+                               sync_records=8, sync_ms=2000)
+    model = SimpleNamespace(dbn=str(tmp_path / 'test.sqlite'),
+                            adifn=str(tmp_path / 'test.adi'),
+                            park='K-0001', shift='', settings=settings,
+                            instance=lambda id_: inst)
+    db = WsjtxDb(model)
+    yield db
+    db.close()
+
+
+def log(call):
+    """ a LOG record as rx_msg decodes it """
+    t = (JDAY, 12 * 3_600_000, 1, 0)
+    return SimpleNamespace(id_='WSJT-X', time_off=t, dx_call=call,
+                           dx_grid='FN42', tx_freq=14_074_000, mode='FT8',
+                           rst_sent='-10', rst_recv='-12', tx_power='',
+                           comments='', name='', time_on=t, op_call='',
+                           my_call='W1AW', my_grid='FN31', ex_sent='',
+                           ex_recv='', adif_md='')
+
+
+def decode(mode='~'):
+    return SimpleNamespace(id_='WSJT-X', mode=mode)
+
+
+def test_exists(db):
+    db.add(log('K1ABC'))
+    assert db.exists('K1ABC', decode()) == 1
+    assert db.exists('K1ABC', decode('+')) == 0
+    assert db.exists('W9XYZ', decode()) == 0
+    assert 'K1ABC' in db.calls and 'FN42' in db.grids
+
+
+def test_import_keeps_pending(db, tmp_path):
+    # a LOG still waiting for its ADIF is only in the in-memory index
+    db.add(log('K1ABC'))
+    fn = tmp_path / 'import.adi'
+    fn.write_text('<EOH>\n<call:5>W9XYZ <mode:3>FT8 <qso_date:8>20240322 '
+                  '<time_on:4>1200 <freq:9>14.074000 <gridsquare:4>EN52 '
+                  '<my_sig:4>POTA <my_sig_info:6>K-0002 <eor>\n')
+    assert db.import_adif(str(fn)) == (1, 0)
+    assert db.exists('K1ABC', decode()) == 1
+    assert 'W9XYZ' in db.calls and 'EN52' in db.grids
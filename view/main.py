@@ -22,6 +22,7 @@ class MainView(tk.Tk):
         self.park = tk.StringVar(value=park)
         self.time_text = tk.StringVar()
         self.shift_text = tk.StringVar(value=shift)
+        self.display_text = tk.StringVar()
     
     def layout(self, x, y, win32):
         if x > self.winfo_screenwidth():
@@ -46,6 +47,8 @@ class MainView(tk.Tk):
         f.pack(pady=(0,10))
         self.rx_tx_label = ttk.Label(f, textvariable=self.rx_tx)
         self.rx_tx_label.pack(anchor='center')
+        # seconds into the T/R period the first call of a cycle showed
+        ttk.Label(f, textvariable=self.display_text).pack(anchor='center')
 
         cb = ttk.Frame(bg)
         cb.pack(expand=True, fill='y', pady=(0,10))
@@ -91,10 +94,15 @@ class MainView(tk.Tk):
         
         c.configure(yscrollcommand=vsb.set)
 
-        c['columns'] = ('SNR','Message')
+        c['columns'] = ('SNR','Message','Rig','Score','Detail')
+        # the Rig column is only shown with more than one WSJT-X instance
+        c['displaycolumns'] = ('Score','SNR','Message','Detail')
         c.column('#0', width=0, stretch='no')
+        c.column('Score', width=40, stretch='no')
         c.column('SNR', width=30, stretch='no')
         c.column('Message', width=150, stretch='yes')
+        c.column('Detail', width=140, stretch='no')
+        c.column('Rig', width=80, stretch='no')
         return c
 
 